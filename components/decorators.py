@@ -7,7 +7,7 @@ from discord import (
 
 
 # Order of checks should typically follow a certain hierarchy
-# Blacklisted -> Premium -> Logged In -> Cool Downs -> Other Checks
+# Blacklisted -> Premium -> Logged In -> Cool Downs -> Other Checks -> Prefetching
 
 
 def is_not_blacklisted():
@@ -18,6 +18,14 @@ def is_not_blacklisted():
     return app_commands.check(predicate)
 
 
+def is_owner():
+    async def predicate(interaction: Interaction) -> bool:
+        if await interaction.client.is_owner(interaction.user) is not True:
+            raise app_commands.CheckFailure('You must be a bot owner to use that command.')
+        return True
+    return app_commands.check(predicate)
+
+
 def is_premium():
     async def predicate(interaction: Interaction) -> bool:
         if await interaction.client.user_is_premium(interaction.user.id) is not True:
@@ -34,6 +42,16 @@ def is_logged_in():
     return app_commands.check(predicate)
 
 
+def prefetches_profile():
+    # Should be the last check, so the profile only starts loading once the command is actually going to run
+    # The load then overlaps with the command deferring its response, rather than starting after it
+    async def predicate(interaction: Interaction) -> bool:
+        if getattr(interaction.namespace, 'display', None) is None:
+            await interaction.client.prefetch_profile(interaction.user.id)
+        return True
+    return app_commands.check(predicate)
+
+
 def non_premium_cooldown():
     async def predicate(interaction: Interaction) -> Optional[app_commands.Cooldown]:
         if await interaction.client.user_is_premium(interaction.user.id) is not True:
@@ -59,5 +59,8 @@ class LoginModal(ui.Modal):
 
         self.bot.add_auth_session(auth_session)
 
-        display_name = (await auth_session.get_own_account()).display
+        # Users who opted in get their profile loaded while we respond, ready for their first command
+        await self.bot.prefetch_profile(interaction.user.id)
+
+        display_name = (await auth_session.load_account())[0].display
         await self.bot.basic_response(interaction, f'Successfully logged in as `{display_name}`.')
@@ -1,4 +1,7 @@
-from discord import ui, ButtonStyle
+import asyncio
+from typing import Callable, Awaitable
+
+from discord import ui, ButtonStyle, Embed
 
 
 # noinspection PyUnusedLocal
@@ -52,3 +55,62 @@ class Paginator(ui.View):
         for button in self.children:
             button.disabled = True
         await self.interaction.edit_original_response(view=self)
+
+
+class LazyPaginator(Paginator):
+
+    """
+    A `Paginator` whose pages are only built when they are first shown, for lists that are slow to render in full.
+
+    `load_page` is called with a zero-based page index. Whenever a page is shown, the next one is loaded in the
+    background so that it is usually ready by the time the user gets to it.
+    """
+
+    def __init__(
+            self,
+            interaction,
+            page_count: int,
+            load_page: Callable[[int], Awaitable[Embed]]
+    ):
+        self.load_page = load_page
+        self._loading: dict[int, asyncio.Task] = {}
+
+        super().__init__(interaction, [None] * max(page_count, 1))
+
+    def _load(self, index: int) -> asyncio.Task:
+        task = self._loading.get(index)
+        if task is None:
+            task = self._loading[index] = asyncio.create_task(self.load_page(index))
+            task.add_done_callback(lambda done: self._forget_failed(index, done))
+        return task
+
+    def _forget_failed(self, index: int, task: asyncio.Task) -> None:
+        # A page that failed to load (e.g. due to rate limiting) is tried again when the user navigates to it
+        if not task.cancelled() and task.exception() is not None and self._loading.get(index) is task:
+            del self._loading[index]
+
+    async def page(self, index: int) -> Embed:
+        if self.embeds[index] is None:
+            self.embeds[index] = await asyncio.shield(self._load(index))
+        return self.embeds[index]
+
+    def prefetch(self, index: int) -> None:
+        if 0 <= index < len(self.embeds) and self.embeds[index] is None:
+            self._load(index)
+
+    async def first_page(self) -> Embed:
+        embed = await self.page(0)
+        self.prefetch(1)
+        return embed
+
+    async def edit_page(self, interaction):
+        await interaction.response.defer()
+        self.update_buttons()
+        embed = await self.page(self.current_page - 1)
+        self.prefetch(self.current_page)
+        await self.interaction.edit_original_response(embed=embed, view=self)
+
+    async def on_timeout(self):
+        for task in self._loading.values():
+            task.cancel()
+        await super().on_timeout()
@@ -1,13 +1,15 @@
 import logging
-from time import time
+import asyncio
+from time import monotonic
 from math import floor
-from typing import Union, Optional
+from typing import Union, Optional, Callable
 from weakref import ref
 
 from dateutil import parser
 
-from core.errors import UnknownItem, BadItemData, HTTPException, NotFound
-from core.fortnite import Schematic, Survivor, LeadSurvivor, SurvivorSquad, Hero, AccountResource
+from core.cache import PartitionedCache
+from core.errors import STWException, UnknownItem, BadItemData, HTTPException, NotFound, TooManyRequests
+from core.fortnite import Schematic, Survivor, LeadSurvivor, SurvivorSquad, Hero, AccountResource, sort_by_power
 
 
 class ExternalConnection:
@@ -43,8 +45,14 @@ class PartialEpicAccount:
     The `auth_session` does not necessarily belong to the `PartialEpicAccount` itself.
 
     Rather, it is the AuthSession that was used to retrieve the `PartialEpicAccount`s data.
+
+    Its profile and the objects built from it are kept in the client's shared `profile_cache`, under the Discord ID of
+    that AuthSession, so they count towards (and can be evicted by) the memory budget shared by every user.
     """
 
+    # The objects built from the profile, which are cached alongside it
+    cached_objects = ('icon', 'schematics', 'survivors', 'heroes', 'resources', 'squads')
+
     def __init__(
             self,
             auth_session,
@@ -55,28 +63,23 @@ class PartialEpicAccount:
         self.id = data.get('id') or data.get('accountId')
         self.display = data.get('displayName')
 
-        self._raw_data = {}
-        self._raw_data_update_at = time() + 300
-
-        self._icon_url = None
-
-        self._object_cache = {}
-
-        empty_cache_slot = self._empty_cache_slot()
-        for object_type in ['schematics', 'survivors', 'resources', 'heroes', 'squads']:
-            self._object_cache[object_type] = empty_cache_slot
+        # Held directly, so cached data can still be read after the (weakly referenced) session has ended
+        self._cache: PartitionedCache = auth_session.client.profile_cache
+        self._cache_partition: int = auth_session.discord_id
 
     @staticmethod
     def _dt_to_int(dt: str) -> int:
         return floor(parser.parse(dt).timestamp())
 
-    @staticmethod
-    def _empty_cache_slot() -> dict:
-        return {'items': [], 'update_at': time() + 300}
+    def _cache_key(self, name: str) -> tuple:
+        return self._cache_partition, self.id, name
 
-    @staticmethod
-    def _needs_update(object_cache_slot: dict) -> bool:
-        return not object_cache_slot['items'] or object_cache_slot['update_at'] < time()
+    def _live_session(self):
+        # Anything that is not cached has to be requested, which needs the session this account came from
+        auth_session = self.auth_session()
+        if auth_session is None:
+            raise STWException('This session has ended, please log in again.')
+        return auth_session
 
     @staticmethod
     def _squad_mapping() -> dict:
@@ -91,131 +94,181 @@ class PartialEpicAccount:
             'squad_attribute_synthesis_thethinktank'
         )}
 
-    async def fort_data(self) -> dict:
-        if not self._raw_data or self._raw_data_update_at < time():
-            self._raw_data = await self.auth_session().profile_request(epic_id=self.id)
-            self._raw_data_update_at = time() + 300
-        return self._raw_data
+    def set_fort_data(self, data: dict) -> None:
+        self._cache.put(self._cache_key('profile'), data)
 
-    async def icon_url(self) -> Optional[str]:
-        if self._icon_url is None:
+    async def fort_data(self) -> dict:
+        # Concurrent callers (e.g. `prefetch`) share one profile request instead of each making their own
+        return await self._cache.get_or_load(
+            self._cache_key('profile'),
+            lambda: self._live_session().profile_request(epic_id=self.id)
+        )
 
+    async def prefetch(self, *objects: str) -> tuple:
+        """
+        Loads the profile once, then each of the requested objects concurrently, and returns them in order.
+
+        Valid objects are `icon`, `schematics`, `survivors`, `squads`, `heroes` and `resources`.
+        """
+        loaders = {
+            'icon': self.icon_url,
+            'schematics': self.schematics,
+            'survivors': self.survivors,
+            'squads': self.survivor_squads,
+            'heroes': self.heroes,
+            'resources': self.resources
+        }
+
+        # Loading the profile first means a missing profile fails once, here, rather than in every loader
+        if objects:
             try:
-                data = await self.fort_data()
-                items = data['profileChanges'][0]['profile']['items']
-            except (KeyError, NotFound):
-                return
-
-            for item in items:
-                if items[item]['templateId'].startswith('CosmeticLocker'):
-
-                    try:
-                        char_id = items[item]['attributes']['locker_slots_data']['slots']['Character']['items'][0][16:]
+                await self.fort_data()
+            except NotFound:
+                # Accounts without a Save the World profile still have a (missing) icon, but no typed items
+                if set(objects) != {'icon'}:
+                    raise
+        return tuple(await asyncio.gather(*[loaders[name]() for name in objects]))
 
-                        character_data = await self.auth_session().client.request(
-                            'get',
-                            f'https://fortnite-api.com/v2/cosmetics/br/{char_id}'
-                        )
-                        self._icon_url = character_data['data']['images']['icon']
+    @staticmethod
+    def _locker_character_id(data: dict) -> Optional[str]:
+        try:
+            items = data['profileChanges'][0]['profile']['items']
+        except (KeyError, IndexError):
+            return None
+
+        for item in items.values():
+            if item['templateId'].startswith('CosmeticLocker'):
+                try:
+                    # Strips the 'AthenaCharacter:' prefix from the equipped outfit's template ID
+                    return item['attributes']['locker_slots_data']['slots']['Character']['items'][0][16:]
+                except (KeyError, IndexError, TypeError):
+                    continue
 
-                    except (KeyError, HTTPException):
-                        continue
+    async def icon_url(self) -> Optional[str]:
+        try:
+            data = await self.fort_data()
+        except NotFound:
+            return
+
+        return await self._cache.get_or_load(
+            self._cache_key('icon'),
+            lambda: self._live_session().client.icons.icon_url(self._locker_character_id(data))
+        )
 
-                    break
+    async def _cached_objects(self, name: str, loader: Callable) -> list:
+        objects = await self._cache.get_or_load(self._cache_key(name), loader)
 
-        return self._icon_url
+        # Cached objects are shared by every account object with the same session and Epic ID, but each one refers
+        # back (weakly) to the account that built it, which may have been replaced and garbage collected since
+        if objects and objects[0].account() is not self:
+            for entity in objects:
+                entity.account = ref(self)
+                for member in [getattr(entity, 'lead', None), *getattr(entity, 'survivors', ())]:
+                    if member is not None:
+                        member.account = ref(self)
+        return objects
 
     async def fort_items(self) -> dict:
         return (await self.fort_data())['profileChanges'][0]['profile']['items']
 
     async def schematics(self) -> list[Schematic]:
-        if self._needs_update(self._object_cache['schematics']):
-            self._object_cache['schematics'] = self._empty_cache_slot()
-
-            items = await self.fort_items()
-            for item in items:
-                if items[item]['templateId'].startswith('Schematic:sid'):
-                    try:
-                        schematic = Schematic(self, item, items[item]['templateId'], items[item]['attributes'])
-                    except UnknownItem as error:
-                        logging.error(error)
-                        continue
-                    self._object_cache['schematics']['items'].append(schematic)
-
-        self._object_cache['schematics']['items'].sort(key=lambda x: x.power_level, reverse=True)
-        return self._object_cache['schematics']['items']
+        schematics = await self._cached_objects('schematics', self._load_schematics)
+        sort_by_power(schematics)
+        return schematics
 
-    async def survivors(self) -> list[Union[Survivor, LeadSurvivor]]:
-        if self._needs_update(self._object_cache['survivors']):
-            self._object_cache['survivors'] = self._empty_cache_slot()
+    async def _load_schematics(self) -> list[Schematic]:
+        schematics = []
 
-            items = await self.fort_items()
-            for item in items:
+        items = await self.fort_items()
+        for item in items:
+            if items[item]['templateId'].startswith('Schematic:sid'):
                 try:
-                    if items[item]['templateId'].startswith('Worker:worker'):
-                        survivor = Survivor(self, item, items[item]['templateId'], items[item]['attributes'])
-                    elif items[item]['templateId'].startswith('Worker:manager'):
-                        survivor = LeadSurvivor(self, item, items[item]['templateId'], items[item]['attributes'])
-                    else:
-                        continue
-                except (UnknownItem, BadItemData) as error:
+                    schematic = Schematic(self, item, items[item]['templateId'], items[item]['attributes'])
+                except UnknownItem as error:
                     logging.error(error)
                     continue
-                self._object_cache['survivors']['items'].append(survivor)
+                schematics.append(schematic)
+
+        return schematics
+
+    async def survivors(self) -> list[Union[Survivor, LeadSurvivor]]:
+        survivors = await self._cached_objects('survivors', self._load_survivors)
+        sort_by_power(survivors)
+        return survivors
+
+    async def _load_survivors(self) -> list[Union[Survivor, LeadSurvivor]]:
+        survivors = []
+
+        items = await self.fort_items()
+        for item in items:
+            try:
+                if items[item]['templateId'].startswith('Worker:worker'):
+                    survivor = Survivor(self, item, items[item]['templateId'], items[item]['attributes'])
+                elif items[item]['templateId'].startswith('Worker:manager'):
+                    survivor = LeadSurvivor(self, item, items[item]['templateId'], items[item]['attributes'])
+                else:
+                    continue
+            except (UnknownItem, BadItemData) as error:
+                logging.error(error)
+                continue
+            survivors.append(survivor)
 
-        self._object_cache['survivors']['items'].sort(key=lambda x: x.base_power_level, reverse=True)
-        return self._object_cache['survivors']['items']
+        return survivors
 
     async def heroes(self) -> list[Hero]:
-        if self._needs_update(self._object_cache['heroes']):
-            self._object_cache['heroes'] = self._empty_cache_slot()
-
-            items = await self.fort_items()
-            for item in items:
-                if items[item]['templateId'].startswith('Hero:hid'):
-                    try:
-                        hero = Hero(self, item, items[item]['templateId'], items[item]['attributes'])
-                    except UnknownItem as error:
-                        logging.error(error)
-                        continue
-                    self._object_cache['heroes']['items'].append(hero)
+        heroes = await self._cached_objects('heroes', self._load_heroes)
+        sort_by_power(heroes)
+        return heroes
 
-        self._object_cache['heroes']['items'].sort(key=lambda x: x.power_level, reverse=True)
-        return self._object_cache['heroes']['items']
+    async def _load_heroes(self) -> list[Hero]:
+        heroes = []
+
+        items = await self.fort_items()
+        for item in items:
+            if items[item]['templateId'].startswith('Hero:hid'):
+                try:
+                    hero = Hero(self, item, items[item]['templateId'], items[item]['attributes'])
+                except UnknownItem as error:
+                    logging.error(error)
+                    continue
+                heroes.append(hero)
+
+        return heroes
 
     async def resources(self) -> list[AccountResource]:
-        if self._needs_update(self._object_cache['resources']):
-            self._object_cache['resources'] = self._empty_cache_slot()
-
-            items = await self.fort_items()
-            for item in items:
-                if items[item]['templateId'].startswith('AccountResource'):
-                    try:
-                        resource = AccountResource(self, item, items[item]['templateId'], items[item]['quantity'])
-                    except UnknownItem as error:
-                        logging.error(error)
-                        continue
-                    self._object_cache['resources']['items'].append(resource)
+        return await self._cached_objects('resources', self._load_resources)
 
-        return self._object_cache['resources']['items']
+    async def _load_resources(self) -> list[AccountResource]:
+        resources = []
 
-    async def survivor_squads(self) -> list[SurvivorSquad]:
-        if self._needs_update(self._object_cache['squads']):
-            self._object_cache['squads'] = self._empty_cache_slot()
+        items = await self.fort_items()
+        for item in items:
+            if items[item]['templateId'].startswith('AccountResource'):
+                try:
+                    resource = AccountResource(self, item, items[item]['templateId'], items[item]['quantity'])
+                except UnknownItem as error:
+                    logging.error(error)
+                    continue
+                resources.append(resource)
 
-            mapping = self._squad_mapping()
-            for survivor in await self.survivors():
-                if survivor.squad_id is not None:
-                    if isinstance(survivor, LeadSurvivor):
-                        mapping[survivor.squad_id]['lead'] = survivor
-                    elif isinstance(survivor, Survivor):
-                        mapping[survivor.squad_id]['survivors'].append(survivor)
+        return resources
 
-            for squad in mapping:
-                squad = SurvivorSquad(self, squad, lead=mapping[squad]['lead'], survivors=mapping[squad]['survivors'])
-                self._object_cache['squads']['items'].append(squad)
+    async def survivor_squads(self) -> list[SurvivorSquad]:
+        return await self._cached_objects('squads', self._load_survivor_squads)
+
+    async def _load_survivor_squads(self) -> list[SurvivorSquad]:
+        mapping = self._squad_mapping()
+        for survivor in await self.survivors():
+            if survivor.squad_id is not None:
+                if isinstance(survivor, LeadSurvivor):
+                    mapping[survivor.squad_id]['lead'] = survivor
+                elif isinstance(survivor, Survivor):
+                    mapping[survivor.squad_id]['survivors'].append(survivor)
 
-        return self._object_cache['squads']['items']
+        return [
+            SurvivorSquad(self, squad, lead=mapping[squad]['lead'], survivors=mapping[squad]['survivors'])
+            for squad in mapping
+        ]
 
 
 class FriendEpicAccount(PartialEpicAccount):
@@ -277,45 +330,36 @@ class FullEpicAccount(PartialEpicAccount):
 
         return externals
 
-    @staticmethod
-    def _chunk(list_: list, n: int = 100):
-        for i in range(0, len(list_), n):
-            yield list_[i:i + n]
-
-    # Priority is to make as few API calls as possible
-    # Some polishing and speed optimisation might be doable
-    async def friends_list(self, friend_type: str = 'friends') -> list[Union[PartialEpicAccount, FriendEpicAccount]]:
-        data = await self.auth_session().get_own_friend_data()
+    async def friends_list(
+            self,
+            friend_type: str = 'friends',
+            resolve_names: bool = True
+    ) -> list[Union[PartialEpicAccount, FriendEpicAccount]]:
+        auth_session = self.auth_session()
+        data = await auth_session.get_own_friend_data()
 
-        friends_list = []
         cls_ = PartialEpicAccount if friend_type == 'blocklist' else FriendEpicAccount
+        friends = {}
 
         for item in data[friend_type]:
-            friend = cls_(self.auth_session(), item)
-            friends_list.append(friend)
+            friend = cls_(auth_session, item)
+            friends[friend.id] = friend
 
         # Epic does not give us the display names of the accounts when we request friend data
-        # We need to do bulk account lookups to get those ourselves
-        # Making an API call for each individual account is simpler, faster and more readable
-        # But it will likely result in us being rate limited
-
-        # This splits the list of friend IDs into groups of up to 100
-        friend_id_groups = list(self._chunk([account.id for account in friends_list], 100))
+        # Callers that only show part of the list at a time can resolve them later with `resolve_display_names`
+        if resolve_names is True:
+            await self.resolve_display_names(list(friends.values()))
 
-        # This code is blocking, so we limit the number of friend objects being processed
-        # Besides, nobody needs more than 300 people on their friends list... right?
-        if len(friend_id_groups) > 3:
-            friend_id_groups = friend_id_groups[:3]
+        return list(friends.values())
 
-        for friend_id_group in friend_id_groups:
-            id_group_data = await self.auth_session().bulk_account_lookup(friend_id_group)
-            for entry in id_group_data:
-                for account in friends_list:
-                    if entry.get('id') == account.id:
-                        account.display = entry.get('displayName')
-                        break
-
-        return friends_list
+    async def resolve_display_names(self, accounts: list[PartialEpicAccount]) -> None:
+        # Any names that are not in the shared cache are fetched with concurrent bulk account lookups
+        display_names = await self.auth_session().resolve_display_names(
+            [account.id for account in accounts if account.display is None]
+        )
+        for account in accounts:
+            if account.display is None:
+                account.display = display_names.get(account.id)
 
     async def add_friend(
             self,
@@ -352,3 +396,75 @@ class FullEpicAccount(PartialEpicAccount):
             'delete',
             self.auth_session().client.friends_requests_url.format(f'{self.id}/blocklist/{epic_id}')
         )
+
+    @staticmethod
+    def _retry_after(error: TooManyRequests) -> float:
+        try:
+            return float(error.response.headers.get('Retry-After', 5))
+        except (AttributeError, ValueError):
+            return 5
+
+    async def batch_friend_operation(
+            self,
+            operation: str,
+            epic_ids: list[str],
+            concurrency: int = 4,
+            max_retries: int = 3,
+            on_progress: Callable[[int, int], None] = None
+    ) -> dict[str, list]:
+        """
+        Adds, removes, blocks or unblocks many accounts at once, using a small pool of concurrent workers.
+
+        When Epic rate limits a request, every worker pauses for the requested time and the account is retried later.
+
+        `on_progress` is called with the number of completed and total accounts after each one finishes.
+
+        Returns the IDs that succeeded, and (ID, error) pairs for those that failed.
+
+        Any error other than an `HTTPException` stops the remaining workers and is raised.
+        """
+        action = {'add': self.add_friend, 'remove': self.del_friend, 'block': self.block, 'unblock': self.unblock}
+        action = action[operation]
+
+        queue = asyncio.Queue()
+        for epic_id in dict.fromkeys(epic_ids):
+            queue.put_nowait((epic_id, 0))
+
+        total = queue.qsize()
+        results = {'succeeded': [], 'failed': []}
+        paused_until = 0.0
+
+        async def worker():
+            nonlocal paused_until
+
+            while not queue.empty():
+                epic_id, attempt = queue.get_nowait()
+
+                delay = paused_until - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    await action(epic_id)
+                    results['succeeded'].append(epic_id)
+                except TooManyRequests as error:
+                    if attempt < max_retries:
+                        paused_until = max(paused_until, monotonic() + self._retry_after(error))
+                        queue.put_nowait((epic_id, attempt + 1))
+                        continue
+                    results['failed'].append((epic_id, error))
+                except HTTPException as error:
+                    results['failed'].append((epic_id, error))
+
+                if on_progress is not None:
+                    on_progress(len(results['succeeded']) + len(results['failed']), total)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, total))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # If one worker fails unexpectedly, the rest are stopped rather than left making requests in the background
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return results
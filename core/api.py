@@ -1,14 +1,22 @@
 from base64 import b64encode
-from typing import Union
+from hashlib import sha256
+from itertools import chain
+from typing import Union, Optional, Iterable
 from time import time
+import asyncio
 import logging
+import json
+import os
+import sqlite3
 
-from aiohttp import ClientSession, ClientResponse, ClientResponseError
+from aiohttp import ClientSession, ClientResponse, ClientResponseError, ClientError
 from dateutil import parser
 
 from core.errors import STWException, HTTPException, BadRequest, Unauthorized, Forbidden, NotFound, ServerError, \
     TooManyRequests
 from core.accounts import PartialEpicAccount, FullEpicAccount
+from core.cache import TTLCache, LRUCache, PartitionedCache, estimate_size
+from core.cosmetics import CosmeticsIndex
 
 
 async def to_dict(response: ClientResponse) -> Union[dict, list]:
@@ -21,6 +29,72 @@ async def to_dict(response: ClientResponse) -> Union[dict, list]:
         return {}
 
 
+class AccountNameCache:
+
+    """
+    A process-wide, two-way cache between Epic IDs and display names.
+
+    It is filled by every account response we receive, so most display name lookups never reach Epic Games.
+
+    Display names are matched case-insensitively, like Epic's own display name lookups.
+
+    Accounts that Epic reported as not found are remembered for `negative_ttl` seconds, so typos are not re-requested.
+    """
+
+    def __init__(
+            self,
+            ttl: float = 3600,
+            negative_ttl: float = 300,
+            max_size: int = 100000
+    ):
+        self.negative_ttl = negative_ttl
+
+        # Values are the display name or Epic ID for accounts that exist
+        # Accounts that do not exist have the `NotFound` error Epic returned instead, or None if there was no error
+        self._displays = TTLCache(ttl=ttl, max_size=max_size)
+        self._ids = TTLCache(ttl=ttl, max_size=max_size)
+
+    @staticmethod
+    def _get(entries: TTLCache, key: str) -> tuple[bool, Union[str, NotFound, None]]:
+        # Returns whether a fresh entry exists, and its value
+        if key not in entries:
+            return False, None
+        return True, entries.get(key)
+
+    def add(self, epic_id: Optional[str], display: Optional[str]) -> None:
+        if epic_id is None or display is None:
+            return
+
+        # A renamed account's old display name would otherwise keep pointing at it
+        old_display = self._displays.peek(epic_id)
+        if isinstance(old_display, str) and old_display.casefold() != display.casefold():
+            self._ids.invalidate(old_display.casefold())
+
+        self._displays.put(epic_id, display)
+        self._ids.put(display.casefold(), epic_id)
+
+    def add_missing(
+            self,
+            epic_id: Optional[str] = None,
+            display: Optional[str] = None,
+            error: Optional[NotFound] = None
+    ) -> None:
+        if epic_id is not None:
+            self._displays.put(epic_id, error, ttl=self.negative_ttl)
+        if display is not None:
+            self._ids.put(display.casefold(), error, ttl=self.negative_ttl)
+
+    def display(self, epic_id: str) -> tuple[bool, Union[str, NotFound, None]]:
+        return self._get(self._displays, epic_id)
+
+    def epic_id(self, display: str) -> tuple[bool, Union[str, NotFound, None]]:
+        return self._get(self._ids, display.casefold())
+
+    def clear(self) -> None:
+        self._displays.clear()
+        self._ids.clear()
+
+
 class AuthSession:
 
     """
@@ -43,8 +117,9 @@ class AuthSession:
         self.epic_id = self.access_token = self.refresh_token = self.access_expires_at = self.refresh_expires_at = None
         self.renew_data(data)
 
-        self._cached_full_account = None
-        self._cached_full_update_time = 0
+        # Holds our own `FullEpicAccount` under the 'account' key
+        # A prefetch and any command waiting on the same data share one in-flight load of it
+        self._account_cache = TTLCache(ttl=1800)
 
         # True if session was killed via HTTP
         self._expired = False
@@ -64,16 +139,18 @@ class AuthSession:
     def is_expired(self) -> bool:
         return self._expired or self.refresh_expires_at < time()
 
-    @property
-    def cache_is_expired(self) -> bool:
-        return self._cached_full_update_time < time()
-
     @staticmethod
     def _dt_to_float(dt: str) -> float:
         return parser.parse(dt).timestamp()
 
-    def del_own_account(self):
-        self._cached_full_account = None
+    def expire_cache(self) -> None:
+        # Drops our own account once it has expired (profiles and items expire in the client's `profile_cache`)
+        self._account_cache.expire()
+
+    @property
+    def memory_usage(self) -> dict:
+        # The number of cached profiles and objects loaded through this session, and their estimated size in bytes
+        return self.client.profile_cache.partition_usage(self.discord_id)
 
     async def renew(self) -> None:
         # Do nothing if the access token is already active
@@ -124,14 +201,47 @@ class AuthSession:
         self._expired = True
 
     async def get_own_account(self) -> FullEpicAccount:
-        if self._cached_full_account is None or self._cached_full_update_time < time():
-            data = await self.access_request(
-                'get',
-                self.client.account_requests_url.format(self.epic_id)
-            )
-            self._cached_full_account = FullEpicAccount(self, data)
-            self._cached_full_update_time = time() + 1800
-        return self._cached_full_account
+        return await self._account_cache.get_or_load('account', self._fetch_own_account)
+
+    async def _fetch_own_account(self) -> FullEpicAccount:
+        data = await self.access_request(
+            'get',
+            self.client.account_requests_url.format(self.epic_id)
+        )
+        self.client.account_names.add(data.get('id'), data.get('displayName'))
+        return FullEpicAccount(self, data)
+
+    async def load_account(self, display: str = None, *objects: str) -> tuple:
+        """
+        Fetches another player's account by display name (or our own if None), and prefetches `objects` from it.
+
+        Returns the account followed by each of the objects, in order. See `PartialEpicAccount.prefetch`.
+
+        Our own account's ID is already known, so its profile is requested at the same time as the account itself.
+        """
+        if display is not None:
+            account = await self.get_other_account(display=display)
+
+        elif objects and 'account' not in self._account_cache:
+            account = await self._account_cache.get_or_load('account', self._load_own_account)
+
+        else:
+            account = await self.get_own_account()
+
+        return account, *(await account.prefetch(*objects))
+
+    async def _load_own_account(self) -> FullEpicAccount:
+        account, profile = await asyncio.gather(self._fetch_own_account(), self._own_profile())
+        if profile is not None:
+            account.set_fort_data(profile)
+        return account
+
+    async def _own_profile(self) -> Optional[dict]:
+        # Accounts without Save the World have no profile, which `prefetch` handles the same way as when it is warm
+        try:
+            return await self.profile_request()
+        except NotFound:
+            return None
 
     async def get_own_partial(self) -> PartialEpicAccount:
         return await self.get_other_account(epic_id=self.epic_id)
@@ -156,20 +266,77 @@ class AuthSession:
         if epic_id is None and display is None:
             raise STWException('An Epic ID or display name is required.')
 
+        names = self.client.account_names
+        if epic_id is not None:
+            cached = names.display(epic_id)[1]
+            data = {'id': epic_id, 'displayName': cached}
+        else:
+            cached = names.epic_id(display)[1]
+            data = {'id': cached, 'displayName': names.display(cached)[1] if isinstance(cached, str) else None}
+
+        # Accounts that Epic recently told us do not exist fail the same way again, without another request
+        if isinstance(cached, NotFound):
+            raise NotFound(cached.response, {'errorCode': cached.error_code, 'errorMessage': cached.error_message})
+        if isinstance(data['id'], str) and isinstance(data['displayName'], str):
+            return PartialEpicAccount(self, data)
+
         url_prefix = 'displayName/' if epic_id is None else ''
 
-        data = await self.access_request(
-            'get',
-            self.client.account_requests_url.format(url_prefix + (epic_id or display))
-        )
+        try:
+            data = await self.access_request(
+                'get',
+                self.client.account_requests_url.format(url_prefix + (epic_id or display))
+            )
+        except NotFound as not_found:
+            names.add_missing(epic_id, display, error=not_found)
+            raise not_found
+
+        names.add(data.get('id'), data.get('displayName'))
         return PartialEpicAccount(self, data)
 
     async def bulk_account_lookup(self, account_ids: list) -> list:
-        return await self.access_request(
-            'get',
-            self.client.account_requests_url.format(''),
-            params=[('accountId', account_id) for account_id in account_ids]
+        # Epic accepts up to 100 IDs per request, and every concurrent lookup shares the client's limit
+        async with self.client.account_lookup_limit:
+            data = await self.access_request(
+                'get',
+                self.client.account_requests_url.format(''),
+                params=[('accountId', account_id) for account_id in account_ids]
+            )
+
+        for entry in data:
+            self.client.account_names.add(entry.get('id'), entry.get('displayName'))
+        return data
+
+    async def resolve_display_names(self, account_ids: Iterable[str]) -> dict[str, Optional[str]]:
+        """
+        Returns the display name of each account, or None if the account does not exist.
+
+        Only accounts missing from the shared cache are looked up, in concurrent bulk requests of up to 100 IDs.
+        """
+        names = self.client.account_names
+        results = {}
+        missing = []
+
+        for account_id in dict.fromkeys(account_ids):
+            found, display = names.display(account_id)
+            if found is True:
+                results[account_id] = display if isinstance(display, str) else None
+            else:
+                missing.append(account_id)
+
+        groups = await asyncio.gather(
+            *[self.bulk_account_lookup(missing[i:i + 100]) for i in range(0, len(missing), 100)]
         )
+        for entry in chain.from_iterable(groups):
+            results[entry.get('id')] = entry.get('displayName')
+
+        # Epic silently leaves deleted/unknown accounts out of bulk lookups
+        for account_id in missing:
+            if account_id not in results:
+                names.add_missing(epic_id=account_id)
+                results[account_id] = None
+
+        return results
 
     async def profile_request(
             self,
@@ -198,6 +365,82 @@ class AuthSession:
         )
 
 
+class ClientAuthSession:
+
+    """
+    Represents a client credentials session between our client and Epic Games.
+
+    Unlike `AuthSession`, this does not belong to any user. It is used for public and background endpoints.
+
+    That way background jobs never spend a user's rate limit, and still work when nobody is logged in.
+
+    The access token is renewed shortly before it expires, rather than waiting for a request to fail.
+    """
+
+    def __init__(
+            self,
+            client,
+            renew_margin: int = 300
+    ):
+        self.client: EpicGamesClient = client
+        self.renew_margin = renew_margin
+
+        self.access_token: Optional[str] = None
+        self.access_expires_at: float = 0
+
+        self._renew_lock = asyncio.Lock()
+
+    @property
+    def needs_renewal(self) -> bool:
+        return self.access_expires_at - self.renew_margin < time()
+
+    async def renew(self, force: bool = False) -> None:
+        # Callers that arrive while a renewal is in progress wait for it instead of starting another
+        async with self._renew_lock:
+            if force is False and self.needs_renewal is False:
+                return
+
+            response = await self.client.client_credentials()
+            self.access_token = response.get('access_token')
+            self.access_expires_at = AuthSession._dt_to_float(response.get('expires_at'))
+
+    async def access_request(
+            self,
+            method: str,
+            url: str,
+            retry: bool = False,
+            **kwargs
+    ) -> Union[dict, list]:
+        await self.renew()
+
+        try:
+            return await self.client.request(
+                method,
+                url,
+                headers={'Authorization': f'bearer {self.access_token}'},
+                **kwargs
+            )
+
+        except Unauthorized as unauthorized_error:
+
+            if retry is True:
+                raise unauthorized_error
+
+            await self.renew(force=True)
+            return await self.access_request(
+                method,
+                url,
+                retry=True,
+                **kwargs
+            )
+
+    async def get_mission_data(self) -> dict:
+        return await self.access_request(
+            'get',
+            self.client.missions_url
+        )
+
+
 class AsyncRequestsClient:
 
     """
@@ -262,7 +505,14 @@ class EpicGamesClient(AsyncRequestsClient):
 
     def __init__(
             self,
-            session: ClientSession
+            session: ClientSession,
+            client_pool_size: int = 1,
+            icons=None,
+            account_lookup_concurrency: int = 4,
+            display_name_ttl: float = 3600,
+            not_found_ttl: float = 300,
+            profile_ttl: float = 300,
+            profile_memory_budget: int = 256 * 1024 * 1024
     ):
         super().__init__(session)
 
@@ -288,6 +538,63 @@ class EpicGamesClient(AsyncRequestsClient):
 
         self.missions_url = 'https://fngw-mcp-gc-livefn.ol.epicgames.com/fortnite/api/game/v2/world/info'
 
+        # Client credentials sessions used for background work, kept separate from users' sessions
+        self._client_sessions = [ClientAuthSession(self) for _ in range(client_pool_size)]
+        self._client_session_index = 0
+
+        # Bulk account lookups are cheap for us but count heavily against Epic's rate limits
+        self.account_lookup_limit = asyncio.Semaphore(account_lookup_concurrency)
+
+        # Outfit icons for account embeds, which come from a local copy of fortnite-api.com's cosmetics
+        self.icons: FortniteAPIClient = icons or FortniteAPIClient(session)
+
+        # Display names rarely change, and the same accounts are looked up over and over by every user
+        self.account_names = AccountNameCache(ttl=display_name_ttl, negative_ttl=not_found_ttl)
+
+        # Every account's profile and items, keyed by (Discord ID, Epic ID, object) and sharing one memory budget
+        # Idle users' data is evicted first, while their `AuthSession`s (and so their tokens) stay where they are
+        self.profile_cache = PartitionedCache(
+            ttl=profile_ttl,
+            max_cost=profile_memory_budget,
+            cost=self._profile_cache_cost,
+            on_evict=self._on_profile_evict
+        )
+
+    @staticmethod
+    def _profile_cache_cost(value) -> float:
+        # Items refer back to their account, which is not part of the cached data
+        return estimate_size(value, exclude=(PartialEpicAccount,))
+
+    def _on_profile_evict(self, key: tuple, _value, _reason: str) -> None:
+        # Objects built from a profile must not outlive it
+        if key[-1] == 'profile':
+            for name in PartialEpicAccount.cached_objects:
+                self.profile_cache.invalidate((*key[:-1], name))
+
+    def client_session(self) -> ClientAuthSession:
+        # Spread background requests across the pool in turn
+        self._client_session_index = (self._client_session_index + 1) % len(self._client_sessions)
+        return self._client_sessions[self._client_session_index]
+
+    async def renew_client_sessions(self) -> None:
+        await asyncio.gather(*[session.renew() for session in self._client_sessions])
+
+    async def client_credentials(self) -> dict:
+        return await self.request(
+            'post',
+            self.auth_exchange_url,
+            headers={
+                'Content-Type':
+                    'application/x-www-form-urlencoded',
+                'Authorization':
+                    f'basic {self.secret}'
+            },
+            data={
+                'grant_type':
+                    'client_credentials'
+            }
+        )
+
     async def create_auth_session(
             self,
             auth_code: str,
@@ -331,3 +638,137 @@ class EpicGamesClient(AsyncRequestsClient):
                     refresh_token
             }
         )
+
+
+class FortniteCentralClient(AsyncRequestsClient):
+
+    """
+    Subclass of `AsyncRequestsClient` for exporting game files from FortniteCentral.
+
+    Game files such as tile themes only change between game updates, so exports are cached by a hash of their path.
+
+    The cache has a bounded in-memory LRU layer backed by JSON files on disk, so a restart does not refetch everything.
+
+    Concurrent requests for the same file share one HTTP request, and only so many requests may be in flight at once.
+    """
+
+    def __init__(
+            self,
+            session: ClientSession,
+            cache_dir: str = './cache/fortnitecentral',
+            max_age: int = 604800,
+            max_concurrency: int = 8,
+            max_memory_entries: int = 1000
+    ):
+        super().__init__(session)
+
+        self.export_url = 'https://fortnitecentral.genxgames.gg/api/v1/export?path={0}'
+
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+        self._memory_cache = LRUCache(max_size=max_memory_entries)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @staticmethod
+    def _cache_key(path: str) -> str:
+        return sha256(path.encode()).hexdigest()
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        file_path = os.path.join(self.cache_dir, f'{key}.json')
+        try:
+            if os.path.getmtime(file_path) + self.max_age < time():
+                return None
+            with open(file_path) as file:
+                # An empty export is never valid, so one cached by an older version is fetched again
+                return json.load(file) or None
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, data: dict) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, f'{key}.json'), 'w') as file:
+                json.dump(data, file)
+        except OSError as error:
+            logging.error(f'Could not write FortniteCentral cache entry {key}: {error}')
+
+    async def _load(self, path: str, key: str) -> dict:
+        data = await asyncio.to_thread(self._read_disk, key)
+
+        if data is None:
+            async with self._semaphore:
+                data = await self.request('get', self.export_url.format(path))
+
+            # `to_dict` gives an empty dict for empty or non-JSON responses, which must not be cached for a week
+            if not isinstance(data, dict) or not data:
+                raise STWException(f'FortniteCentral returned an empty export for {path}.')
+            await asyncio.to_thread(self._write_disk, key, data)
+
+        return data
+
+    async def export(self, path: str) -> dict:
+        key = self._cache_key(path)
+        return await self._memory_cache.get_or_load(key, lambda: self._load(path, key))
+
+
+class FortniteAPIClient(AsyncRequestsClient):
+
+    """
+    Subclass of `AsyncRequestsClient` for keeping a local copy of fortnite-api.com's cosmetics dataset.
+
+    The full dataset is downloaded by `sync_cosmetics` (once a day) into a `CosmeticsIndex`.
+
+    Cosmetic lookups such as outfit icons are then answered locally, without any requests during interactions.
+    """
+
+    def __init__(
+            self,
+            session: ClientSession,
+            index: CosmeticsIndex = None,
+            max_age: int = 86400
+    ):
+        super().__init__(session)
+
+        self.cosmetics_url = 'https://fortnite-api.com/v2/cosmetics/br'
+
+        self.index = index or CosmeticsIndex()
+        self.max_age = max_age
+
+        self._sync_lock = asyncio.Lock()
+
+    async def _download(self, file_path: str) -> None:
+        # The dataset is tens of megabytes, so it is streamed to disk and parsed in a thread rather than in memory
+        async with self.session.get(self.cosmetics_url) as response:
+            logging.info(f'({response.status}) GET    {self.cosmetics_url}')
+            if response.status != 200:
+                raise HTTPException(response, await to_dict(response))
+
+            # Disk writes are done in a thread too, so a slow disk never blocks the event loop
+            file = await asyncio.to_thread(open, file_path, 'wb')
+            try:
+                async for chunk in response.content.iter_chunked(1048576):
+                    await asyncio.to_thread(file.write, chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+
+    async def sync_cosmetics(self, force: bool = False) -> None:
+        async with self._sync_lock:
+            if force is False and self.index.needs_sync(self.max_age) is False:
+                return
+
+            file_path = self.index.path + '.download'
+            try:
+                await self._download(file_path)
+                await asyncio.to_thread(self.index.import_file, file_path)
+            except (HTTPException, ClientError, asyncio.TimeoutError, OSError, ValueError, sqlite3.Error) as error:
+                # Logged rather than raised, so one failed sync does not stop the hourly sync loop for good
+                logging.error(f'Could not sync the cosmetics dataset: {error}')
+            finally:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+    async def icon_url(self, character_id: Optional[str]) -> Optional[str]:
+        return self.index.icon(character_id)
@@ -0,0 +1,325 @@
+import sys
+import asyncio
+from collections import OrderedDict
+from itertools import islice
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional, Union
+
+
+def _estimate_size(value: Any, exclude: tuple, sample: int, seen: set, depth: int) -> float:
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool, type(None))) or depth > 8:
+        return size
+
+    if isinstance(value, dict):
+        children = [*islice(value.keys(), sample), *islice(value.values(), sample)]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        children = list(islice(value, sample))
+    elif hasattr(value, '__dict__') and not isinstance(value, exclude):
+        return size + _estimate_size(vars(value), exclude, sample, seen, depth + 1)
+    else:
+        return size
+
+    if not value:
+        return size
+
+    # Only the first `sample` children are measured, and the rest are assumed to be about the same size
+    measured = sum(_estimate_size(child, exclude, sample, seen, depth + 1) for child in children)
+    return size + measured * len(value) / min(len(value), sample)
+
+
+def estimate_size(value: Any, exclude: tuple = (), sample: int = 32) -> float:
+    """
+    Estimates how many bytes of memory `value` and everything it contains are using.
+
+    Large containers are sampled rather than walked in full, which is within a few percent for uniform data such as
+    Epic profiles, at a small fraction of the cost. Objects that are counted elsewhere can be skipped with `exclude`.
+    """
+    return _estimate_size(value, exclude, sample, set(), 0)
+
+
+class CacheEntry:
+
+    """
+    A single cached value, with the time it expires at (on the monotonic clock) and its cost towards `max_cost`.
+    """
+
+    __slots__ = ('value', 'expires_at', 'cost')
+
+    def __init__(
+            self,
+            value: Any,
+            expires_at: Optional[float],
+            cost: float
+    ):
+        self.value = value
+        self.expires_at = expires_at
+        self.cost = cost
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+class AsyncCache:
+
+    """
+    An in-memory cache with optional expiry, size and cost limits, for use from asyncio code.
+
+    Entries expire `ttl` seconds after being stored (never if `ttl` is None), measured on a monotonic clock so that
+    system clock changes cannot expire everything at once or keep entries alive forever.
+
+    Once there are more than `max_size` entries, or their total cost exceeds `max_cost`, the least recently used
+    entries are evicted. Each entry's cost comes from the `cost` function, and is 1 by default.
+
+    `on_evict(key, value, reason)` is called whenever an entry leaves the cache, where `reason` is one of
+    'expired', 'size', 'replaced', 'invalidated' or 'cleared'.
+
+    `get_or_load` makes concurrent lookups of the same missing key share a single call to the loader.
+    """
+
+    def __init__(
+            self,
+            ttl: Optional[float] = None,
+            max_size: Optional[int] = None,
+            max_cost: Optional[float] = None,
+            cost: Callable[[Any], float] = None,
+            on_evict: Callable[[Hashable, Any, str], None] = None,
+            clock: Callable[[], float] = monotonic
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_cost = max_cost
+        self.cost = cost
+        self.on_evict = on_evict
+        self.clock = clock
+
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self._total_cost = 0.0
+
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'load_failures': 0,
+            'expirations': 0,
+            'evictions': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._fresh_entry(key) is not None
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._entries))
+
+    @property
+    def total_cost(self) -> float:
+        return self._total_cost
+
+    @property
+    def metrics(self) -> dict:
+        lookups = self._metrics['hits'] + self._metrics['misses']
+        return {
+            **self._metrics,
+            'hit_rate': self._metrics['hits'] / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'cost': self._total_cost,
+            'in_flight': len(self._in_flight)
+        }
+
+    def _added(self, key: Hashable, entry: CacheEntry) -> None:
+        # Called whenever an entry is stored, or its cost changes, so subclasses can keep their own accounting
+        pass
+
+    def _removed(self, key: Hashable, entry: CacheEntry) -> None:
+        pass
+
+    def _remove(self, key: Hashable, reason: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_cost -= entry.cost
+        self._removed(key, entry)
+
+        if reason == 'expired':
+            self._metrics['expirations'] += 1
+        elif reason == 'size':
+            self._metrics['evictions'] += 1
+
+        if self.on_evict is not None:
+            self.on_evict(key, entry.value, reason)
+
+    def _fresh_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.is_expired(self.clock()):
+            self._remove(key, 'expired')
+            return None
+        return entry
+
+    def _enforce_limits(self) -> None:
+        while self._entries and (
+                (self.max_size is not None and len(self._entries) > self.max_size)
+                or (self.max_cost is not None and self._total_cost > self.max_cost)
+        ):
+            self._remove(next(iter(self._entries)), 'size')
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        # Returns a fresh cached value without counting as a use, so it does not affect LRU order or metrics
+        entry = self._fresh_entry(key)
+        return entry.value if entry is not None else default
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._fresh_entry(key)
+        if entry is None:
+            self._metrics['misses'] += 1
+            return default
+
+        self._metrics['hits'] += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = ..., cost: Optional[float] = None) -> None:
+        # `ttl` defaults to the cache's own, and may be None for an entry that never expires
+        if key in self._entries:
+            self._remove(key, 'replaced')
+
+        ttl = self.ttl if ttl is ... else ttl
+        cost = cost if cost is not None else (self.cost(value) if self.cost is not None else 1)
+
+        entry = self._entries[key] = CacheEntry(value, self.clock() + ttl if ttl is not None else None, cost)
+        self._total_cost += cost
+        self._added(key, entry)
+        self._enforce_limits()
+
+    def update_cost(self, key: Hashable, cost: float) -> None:
+        # For values that grow after being cached, such as lazily filled objects
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._removed(key, entry)
+            self._total_cost += cost - entry.cost
+            entry.cost = cost
+            self._added(key, entry)
+            self._enforce_limits()
+
+    def invalidate(self, key: Hashable) -> None:
+        # Any load already in flight may have read the old value, so its result is not cached either
+        self._in_flight.pop(key, None)
+        if key in self._entries:
+            self._remove(key, 'invalidated')
+
+    def clear(self) -> None:
+        self._in_flight.clear()
+        for key in list(self._entries):
+            # An eviction callback may already have removed other entries
+            if key in self._entries:
+                self._remove(key, 'cleared')
+
+    def expire(self) -> int:
+        # Expired entries are otherwise only removed when they are next looked up
+        now = self.clock()
+        expired = [key for key, entry in self._entries.items() if entry.is_expired(now)]
+        for key in expired:
+            if key in self._entries:
+                self._remove(key, 'expired')
+        return len(expired)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable], ttl: Optional[float]) -> Any:
+        self._metrics['loads'] += 1
+        try:
+            value = await loader()
+        except BaseException:
+            self._metrics['load_failures'] += 1
+            raise
+
+        if self._in_flight.get(key) is asyncio.current_task():
+            self.put(key, value, ttl=ttl)
+        return value
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable], ttl: Optional[float] = ...) -> Any:
+        entry = self._fresh_entry(key)
+        if entry is not None:
+            self._metrics['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+        self._metrics['misses'] += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl))
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self._in_flight[key] = task
+
+        # Shielded so that one cancelled caller does not cancel the load for everybody else
+        return await asyncio.shield(task)
+
+    def loading(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+
+class TTLCache(AsyncCache):
+
+    """
+    An `AsyncCache` whose entries expire after `ttl` seconds by default.
+    """
+
+    def __init__(self, ttl: float, max_size: Optional[int] = None, **kwargs):
+        super().__init__(ttl=ttl, max_size=max_size, **kwargs)
+
+
+class LRUCache(AsyncCache):
+
+    """
+    An `AsyncCache` that keeps up to `max_size` of the most recently used entries, which do not expire by default.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, **kwargs):
+        super().__init__(ttl=ttl, max_size=max_size, **kwargs)
+
+
+class PartitionedCache(AsyncCache):
+
+    """
+    An `AsyncCache` whose keys are tuples starting with a partition, such as the user each entry belongs to.
+
+    The number of entries and total cost of each partition are kept up to date, so that a size or cost limit shared
+    by every partition can still be accounted for per partition.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # The cost of each entry, grouped by partition
+        self._partitions: dict[Hashable, dict[tuple, float]] = {}
+
+    def _added(self, key: tuple, entry: CacheEntry) -> None:
+        self._partitions.setdefault(key[0], {})[key] = entry.cost
+
+    def _removed(self, key: tuple, entry: CacheEntry) -> None:
+        partition = self._partitions.get(key[0])
+        if partition is not None:
+            partition.pop(key, None)
+            if not partition:
+                del self._partitions[key[0]]
+
+    def partition_usage(self, partition: Hashable) -> dict[str, Union[int, float]]:
+        costs = self._partitions.get(partition, {})
+        return {'size': len(costs), 'cost': sum(costs.values())}
+
+    def usage(self) -> dict[Hashable, dict[str, Union[int, float]]]:
+        return {partition: self.partition_usage(partition) for partition in self._partitions}
+
+    def invalidate_partition(self, partition: Hashable) -> None:
+        for key in [key for key in self._in_flight if key[0] == partition]:
+            self.invalidate(key)
+        for key in list(self._partitions.get(partition, {})):
+            self.invalidate(key)
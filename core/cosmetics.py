@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import sqlite3
+from time import time
+from typing import Optional, Union
+
+
+class CosmeticsIndex:
+
+    """
+    A local index of Battle Royale cosmetics, stored in SQLite and keyed by cosmetic ID.
+
+    It is filled from fortnite-api.com's full cosmetics dataset once a day, so cosmetic lookups during interactions
+    are local queries that do not depend on a third-party API being up.
+
+    Imports replace the whole index in a single transaction, so readers only ever see a complete dataset.
+
+    An import with no cosmetics, or fewer than `min_fraction` of the cosmetics already indexed, is assumed to be a
+    truncated download and is rolled back, keeping the previous data.
+    """
+
+    def __init__(self, path: str = './cache/cosmetics.sqlite3', min_fraction: float = 0.5):
+        self.path = path
+        self.min_fraction = min_fraction
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # WAL mode lets lookups carry on while an import is being written by another connection
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._create_tables(self._connection)
+
+    @staticmethod
+    def _create_tables(connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cosmetics ('
+                'id TEXT PRIMARY KEY COLLATE NOCASE, name TEXT, type TEXT, rarity TEXT, icon TEXT'
+                ') WITHOUT ROWID'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @staticmethod
+    def _rows(data: Union[dict, list]):
+        # Accepts the API response as-is ({'status': 200, 'data': [...]}) or just the list of cosmetics
+        cosmetics = data.get('data', []) if isinstance(data, dict) else data
+
+        for cosmetic in cosmetics:
+            cosmetic_id = cosmetic.get('id')
+            if not cosmetic_id:
+                continue
+
+            images = cosmetic.get('images') or {}
+            yield (
+                cosmetic_id,
+                cosmetic.get('name'),
+                (cosmetic.get('type') or {}).get('value'),
+                (cosmetic.get('rarity') or {}).get('value'),
+                images.get('icon') or images.get('smallIcon')
+            )
+
+    def import_dataset(self, data: Union[dict, list]) -> int:
+        """
+        Replaces the index with the given cosmetics dataset, and returns the number of cosmetics imported.
+
+        This is blocking, so it should be run in a thread when called from the event loop.
+
+        Raises `ValueError` (leaving the index untouched) if the dataset looks empty or truncated.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                previous = connection.execute('SELECT COUNT(*) FROM cosmetics').fetchone()[0]
+                connection.execute('DELETE FROM cosmetics')
+                count = connection.executemany(
+                    'INSERT OR REPLACE INTO cosmetics (id, name, type, rarity, icon) VALUES (?, ?, ?, ?, ?)',
+                    self._rows(data)
+                ).rowcount
+
+                # Raising inside the transaction rolls it back, so the previous cosmetics are kept
+                if count <= 0 or count < previous * self.min_fraction:
+                    raise ValueError(f'Refusing to replace {previous} indexed cosmetics with a dataset of {count}.')
+                connection.execute(
+                    'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+                    ('synced_at', str(time()))
+                )
+        finally:
+            connection.close()
+
+        logging.info(f'Imported {count} cosmetics into the local index.')
+        return count
+
+    def import_file(self, file_path: str) -> int:
+        with open(file_path, encoding='utf-8') as file:
+            return self.import_dataset(json.load(file))
+
+    @property
+    def synced_at(self) -> float:
+        row = self._connection.execute('SELECT value FROM metadata WHERE key = ?', ('synced_at',)).fetchone()
+        return float(row['value']) if row is not None else 0
+
+    def needs_sync(self, max_age: int = 86400) -> bool:
+        return self.synced_at + max_age < time()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM cosmetics').fetchone()[0]
+
+    def get(self, cosmetic_id: str) -> Optional[dict]:
+        row = self._connection.execute('SELECT * FROM cosmetics WHERE id = ?', (cosmetic_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def icon(self, cosmetic_id: Optional[str]) -> Optional[str]:
+        if cosmetic_id is None:
+            return None
+        row = self._connection.execute('SELECT icon FROM cosmetics WHERE id = ?', (cosmetic_id,)).fetchone()
+        return row['icon'] if row is not None else None
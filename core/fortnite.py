@@ -1,5 +1,13 @@
-from typing import Optional
+from typing import Optional, Iterable
 from weakref import ref
+from array import array
+from functools import lru_cache
+
+# NumPy is optional, it is only used to speed up bulk power level calculations
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
 
 # stringList is a lookup table containing values such as the names, rarities and types of items
 # This is necessary as not all data can be retrieved via HTTP request, some of it is hard-coded in the game
@@ -8,6 +16,81 @@ from resources.lookup import stringList
 from core.errors import UnknownItem, BadItemData
 
 
+# `stringList['Item Power Levels']` is a nested dict keyed by category, rarity, tier and level (as strings)
+# Power levels are needed for every sort key and embed field, so we compile it into a dense integer table once
+# Combinations that do not exist in-game are left as 0
+_POWER_CATEGORIES = ('Other', 'Survivor', 'Lead Survivor')
+_POWER_RARITIES = ('common', 'uncommon', 'rare', 'epic', 'legendary', 'mythic')
+_POWER_TIERS = 6
+_POWER_LEVELS = 61
+
+_category_index = {category: i for i, category in enumerate(_POWER_CATEGORIES)}
+_rarity_index = {rarity: i for i, rarity in enumerate(_POWER_RARITIES)}
+
+
+def _power_index(category: int, rarity: int, tier: int, level: int) -> int:
+    return ((category * len(_POWER_RARITIES) + rarity) * _POWER_TIERS + tier) * _POWER_LEVELS + level
+
+
+def _compile_power_levels() -> array:
+    table = array('H', [0]) * (len(_POWER_CATEGORIES) * len(_POWER_RARITIES) * _POWER_TIERS * _POWER_LEVELS)
+
+    for category, rarities in stringList['Item Power Levels'].items():
+        for rarity, tiers in rarities.items():
+            for tier, levels in tiers.items():
+                for level, power in levels.items():
+                    table[_power_index(_category_index[category], _rarity_index[rarity], int(tier), int(level))] = power
+
+    return table
+
+
+_power_table = _compile_power_levels()
+
+
+def lookup_power_level(category: str, rarity: str, tier: int, level: int) -> int:
+    try:
+        rarity_index = _rarity_index[rarity]
+    except KeyError:
+        return 0
+
+    if not (0 <= tier < _POWER_TIERS and 0 <= level < _POWER_LEVELS):
+        return 0
+
+    return _power_table[_power_index(_category_index[category], rarity_index, tier, level)]
+
+
+def power_levels(items: Iterable) -> list[int]:
+    """
+    Calculates the power levels of many upgradable items at once.
+
+    Uses NumPy to vectorise the table lookups if it is installed, otherwise falls back to the plain `array` table.
+    """
+    items = list(items)
+
+    if numpy is None:
+        return [lookup_power_level(item.power_category, item.rarity, item.tier, item.level) for item in items]
+
+    categories = numpy.fromiter((_category_index[item.power_category] for item in items), numpy.intp, len(items))
+    rarities = numpy.fromiter((_rarity_index.get(item.rarity, -1) for item in items), numpy.intp, len(items))
+    tiers = numpy.fromiter((item.tier for item in items), numpy.intp, len(items))
+    levels = numpy.fromiter((item.level for item in items), numpy.intp, len(items))
+
+    valid = (rarities >= 0) & (tiers >= 0) & (tiers < _POWER_TIERS) & (levels >= 0) & (levels < _POWER_LEVELS)
+    indexes = numpy.where(valid, _power_index(categories, rarities, tiers, levels), 0)
+
+    table = numpy.frombuffer(_power_table, dtype=numpy.uint16)
+    return numpy.where(valid, table[indexes], 0).tolist()
+
+
+def sort_by_power(items: list) -> None:
+    """
+    Sorts a list of upgradable items in-place by power level, highest first.
+    """
+    powers = power_levels(items)
+    order = sorted(range(len(items)), key=powers.__getitem__, reverse=True)
+    items[:] = [items[i] for i in order]
+
+
 class BaseEntity:
 
     """
@@ -115,6 +198,9 @@ class Upgradable(Recyclable):
     # `UpgradeItemBulk` endpoint requires our desired tier as a lower-case Roman numeral.
     __mapping = {1: 'i', 2: 'ii', 3: 'iii', 4: 'iv', 5: 'v'}
 
+    # Which table in `stringList['Item Power Levels']` this item's power level comes from
+    power_category = 'Other'
+
     async def bulk_upgrade(self, level: int, tier: int, index: int = -1) -> None:
         # noinspection PyUnresolvedReferences
         await self.account().auth_session().profile_request(
@@ -168,8 +254,8 @@ class Schematic(Upgradable):
             self.perks = []
 
     @property
-    def power_level(self):
-        return stringList['Item Power Levels']['Other'][self.rarity][f'{self.tier}'][f'{self.level}']
+    def power_level(self) -> int:
+        return lookup_power_level(self.power_category, self.rarity, self.tier, self.level)
 
     @property
     def material(self):
@@ -258,6 +344,8 @@ class Survivor(SurvivorBase):
     Standard (non-leader) survivor account item.
     """
 
+    power_category = 'Survivor'
+
     def __init__(
             self,
             account,
@@ -275,7 +363,7 @@ class Survivor(SurvivorBase):
 
     @property
     def base_power_level(self) -> int:
-        return stringList['Item Power Levels']['Survivor'][self.rarity][f'{self.tier}'][f'{self.level}']
+        return lookup_power_level(self.power_category, self.rarity, self.tier, self.level)
 
 
 class LeadSurvivor(SurvivorBase):
@@ -284,6 +372,8 @@ class LeadSurvivor(SurvivorBase):
     Lead survivor account item.
     """
 
+    power_category = 'Lead Survivor'
+
     def __init__(
             self,
             account,
@@ -300,7 +390,7 @@ class LeadSurvivor(SurvivorBase):
 
     @property
     def base_power_level(self) -> int:
-        return stringList['Item Power Levels']['Lead Survivor'][self.rarity][f'{self.tier}'][f'{self.level}']
+        return lookup_power_level(self.power_category, self.rarity, self.tier, self.level)
 
 
 class ActiveSetBonus:
@@ -396,10 +486,9 @@ class SurvivorSquad:
             else:
                 survivor_point_count += self.lead.base_power_level
 
-        for survivor in self.survivors:
-            power = survivor.base_power_level
+        lead_bonus_increment = stringList['Lead Bonus Increment']
 
-            lead_bonus_increment = stringList['Lead Bonus Increment']
+        for survivor, power in zip(self.survivors, power_levels(self.survivors)):
 
             if self.lead is not None and self.lead.personality == survivor.personality:
                 power += lead_bonus_increment[self.lead.rarity][0]
@@ -422,8 +511,8 @@ class Hero(Upgradable):
     """
 
     @property
-    def power_level(self):
-        return stringList['Item Power Levels']['Other'][self.rarity][f'{self.tier}'][f'{self.level}']
+    def power_level(self) -> int:
+        return lookup_power_level(self.power_category, self.rarity, self.tier, self.level)
 
 
 class AccountResource(AccountItem):
@@ -467,6 +556,28 @@ class MissionAlertReward(AccountResource):
     ):
         super().__init__(None, 'None', kwargs.get('itemType'), kwargs.get('quantity'))
 
+        # Broad reward category, used to index mission alerts by what they reward
+        if self.name == 'VBucks':
+            self.category = 'vbucks'
+        elif self.name == 'Survivor':
+            self.category = 'survivor'
+        elif 'Schematic' in self.template_id:
+            self.category = 'schematic'
+        elif 'Hero' in self.template_id:
+            self.category = 'hero'
+        else:
+            self.category = 'other'
+
+
+# There are only a few dozen distinct mission generator paths, but each is seen many times per refresh
+# So we memoise by exact path, and only fall back to scanning the `stringList['Missions']` patterns for new paths
+@lru_cache(maxsize=None)
+def mission_name(generator: str) -> str:
+    for pattern, name in stringList['Missions'].items():
+        if pattern in generator:
+            return name
+    return 'Unknown Mission'
+
 
 class MissionAlert:
 
@@ -485,6 +596,67 @@ class MissionAlert:
         self.tile_theme = kwargs.get('tile_theme')
         self.alert_rewards = [MissionAlertReward(**reward) for reward in kwargs.get('alert_rewards_data', [])]
 
-        power_data = kwargs.get('power').split(' ')
+        self._power_string = kwargs.get('power')
+        power_data = self._power_string.split(' ')
         self.power = int(power_data[0])
         self.four_player = 'Players' in power_data
+
+    def to_dict(self) -> dict:
+        # The same keyword arguments this alert was created with, so it can be stored and re-created later
+        return {
+            'name': self.name,
+            'power': self._power_string,
+            'theater': self.theater,
+            'tile_theme': self.tile_theme,
+            'alert_rewards_data': [
+                {'itemType': reward.template_id, 'quantity': reward.quantity} for reward in self.alert_rewards
+            ]
+        }
+
+
+class Mission:
+
+    """
+    Represents any mission currently available in the world, whether it has a mission alert or not.
+
+    This does not inherit from `BaseEntity` because it has no owner account nor a template ID.
+
+    If the mission has an alert, `alert` is the corresponding `MissionAlert`.
+    """
+
+    def __init__(
+            self,
+            **kwargs
+    ):
+        self.name = kwargs.get('name')
+        self.theater = kwargs.get('theater')
+        self.tile_index = kwargs.get('tile_index')
+        self.tile_theme = kwargs.get('tile_theme')
+        self.generator = kwargs.get('generator')
+        self.difficulty = kwargs.get('difficulty')
+        self.modifiers: list[str] = kwargs.get('modifiers', [])
+        self.alert: Optional[MissionAlert] = kwargs.get('alert')
+
+        self._power_string = kwargs.get('power')
+        power_data = self._power_string.split(' ')
+        self.power = int(power_data[0])
+        self.four_player = 'Players' in power_data
+
+    def to_dict(self) -> dict:
+        # The same keyword arguments this mission was created with, except that the alert is stored as a dict
+        return {
+            'name': self.name,
+            'power': self._power_string,
+            'theater': self.theater,
+            'tile_index': self.tile_index,
+            'tile_theme': self.tile_theme,
+            'generator': self.generator,
+            'difficulty': self.difficulty,
+            'modifiers': self.modifiers,
+            'alert': self.alert.to_dict() if self.alert is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        alert = MissionAlert(**data['alert']) if data.get('alert') is not None else None
+        return cls(**{**data, 'alert': alert})
@@ -0,0 +1,379 @@
+from time import time
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
+
+from core.fortnite import MissionAlert, Mission, mission_name
+
+
+def utc_day(timestamp: float = None) -> str:
+    # Mission alerts reset at midnight UTC, so snapshots are keyed by the UTC date they were created on
+    return datetime.fromtimestamp(timestamp if timestamp is not None else time(), timezone.utc).strftime('%Y-%m-%d')
+
+
+class MissionAlertSnapshot:
+
+    """
+    An immutable snapshot of a day's mission alerts.
+
+    Each refresh builds a brand-new snapshot and swaps it in as a whole.
+
+    This means readers always see a complete set of alerts, never one that is half-way through being built.
+
+    Alerts are indexed by theater, reward category, reward rarity and power band when the snapshot is built.
+
+    Index values are tuples of alerts in their original order, except `by_theater` which is sorted by power.
+    """
+
+    def __init__(
+            self,
+            alerts: Iterable[MissionAlert],
+            created_at: float = None,
+            power_band_size: int = 10
+    ):
+        self.alerts: tuple[MissionAlert, ...] = tuple(alerts)
+        self.created_at: float = created_at or time()
+        self.day: str = utc_day(self.created_at)
+        self.power_band_size = power_band_size
+
+        by_theater = {}
+        by_category = {}
+        by_reward = {}
+        by_rarity = {}
+        by_power_band = {}
+
+        # Total quantity of each reward category, counting the first matching reward of each alert
+        self.totals: dict[str, int] = {}
+
+        self._positions: dict[int, int] = {}
+
+        for position, alert in enumerate(self.alerts):
+            self._positions[id(alert)] = position
+
+            by_theater.setdefault(alert.theater, []).append(alert)
+            by_power_band.setdefault(self.power_band(alert.power), []).append(alert)
+
+            categories, rewards, rarities = set(), set(), set()
+
+            for reward in alert.alert_rewards:
+                if reward.category not in categories:
+                    self.totals[reward.category] = self.totals.get(reward.category, 0) + (reward.quantity or 0)
+                    categories.add(reward.category)
+                rewards.add((reward.category, reward.rarity))
+                rarities.add(reward.rarity)
+
+            for category in categories:
+                by_category.setdefault(category, []).append(alert)
+            for reward in rewards:
+                by_reward.setdefault(reward, []).append(alert)
+            for rarity in rarities:
+                by_rarity.setdefault(rarity, []).append(alert)
+
+        self.by_theater: dict[Optional[str], tuple[MissionAlert, ...]] = {
+            theater: tuple(sorted(alerts_, key=lambda alert_: alert_.power)) for theater, alerts_ in by_theater.items()
+        }
+        self.by_category: dict[str, tuple[MissionAlert, ...]] = {k: tuple(v) for k, v in by_category.items()}
+        self.by_reward: dict[tuple[str, str], tuple[MissionAlert, ...]] = {k: tuple(v) for k, v in by_reward.items()}
+        self.by_rarity: dict[str, tuple[MissionAlert, ...]] = {k: tuple(v) for k, v in by_rarity.items()}
+        self.by_power_band: dict[int, tuple[MissionAlert, ...]] = {k: tuple(v) for k, v in by_power_band.items()}
+
+    def __iter__(self) -> Iterator[MissionAlert]:
+        return iter(self.alerts)
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    @property
+    def is_current(self) -> bool:
+        return self.day == utc_day()
+
+    def to_dict(self) -> dict:
+        return {
+            'day': self.day,
+            'created_at': self.created_at,
+            'alerts': [alert.to_dict() for alert in self.alerts]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls([MissionAlert(**alert) for alert in data.get('alerts', [])], created_at=data.get('created_at'))
+
+    def history_rows(self) -> list[dict]:
+        # One flat row per alert reward, the shape used by the mission history archive
+        day = datetime.strptime(self.day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        return [
+            {
+                'day': day,
+                'theater': alert.theater,
+                'mission': alert.name,
+                'power': alert.power,
+                'tile_theme': alert.tile_theme,
+                'template_id': reward.template_id,
+                'name': reward.name,
+                'category': reward.category,
+                'rarity': reward.rarity,
+                'quantity': reward.quantity
+            }
+            for alert in self.alerts for reward in alert.alert_rewards
+        ]
+
+    def power_band(self, power: int) -> int:
+        return power // self.power_band_size * self.power_band_size
+
+    def union(self, *groups: Iterable[MissionAlert]) -> list[MissionAlert]:
+        # Merges several index values into one list without duplicates, keeping the original alert order
+        merged = {id(alert): alert for group in groups for alert in group}
+        return sorted(merged.values(), key=lambda alert: self._positions[id(alert)])
+
+
+class WorldModel:
+
+    """
+    An indexed model of every mission currently available in the world, with or without a mission alert.
+
+    This is built in a single pass over Epic's `world/info` payload, keyed by theater ID.
+
+    Missions are indexed by name (mission type), theater, zone theme, modifier and power band,
+    so searches only ever look at the missions in their smallest matching index.
+    """
+
+    def __init__(
+            self,
+            missions: Iterable[Mission],
+            created_at: float = None,
+            power_band_size: int = 10
+    ):
+        self.missions: tuple[Mission, ...] = tuple(missions)
+        self.created_at: float = created_at or time()
+        self.power_band_size = power_band_size
+
+        self.by_name: dict[str, list[Mission]] = {}
+        self.by_theater: dict[str, list[Mission]] = {}
+        self.by_tile_theme: dict[str, list[Mission]] = {}
+        self.by_modifier: dict[str, list[Mission]] = {}
+        self.by_power_band: dict[int, list[Mission]] = {}
+
+        for mission in self.missions:
+            self.by_name.setdefault(mission.name, []).append(mission)
+            self.by_theater.setdefault(mission.theater, []).append(mission)
+            self.by_tile_theme.setdefault(mission.tile_theme, []).append(mission)
+            self.by_power_band.setdefault(self.power_band(mission.power), []).append(mission)
+            for modifier in mission.modifiers:
+                self.by_modifier.setdefault(modifier, []).append(mission)
+
+    def __iter__(self) -> Iterator[Mission]:
+        return iter(self.missions)
+
+    def __len__(self) -> int:
+        return len(self.missions)
+
+    def power_band(self, power: int) -> int:
+        return power // self.power_band_size * self.power_band_size
+
+    def to_dict(self) -> dict:
+        return {
+            'created_at': self.created_at,
+            'missions': [mission.to_dict() for mission in self.missions]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        missions = [Mission.from_dict(mission) for mission in data.get('missions', [])]
+        return cls(missions, created_at=data.get('created_at'))
+
+    @classmethod
+    def from_world_info(
+            cls,
+            data: dict,
+            difficulty_rows: dict,
+            tile_theme_names: dict[str, str]
+    ):
+        """
+        Builds the model from a decoded `world/info` payload.
+
+        `difficulty_rows` are the rows of the `GameDifficultyGrowthBounds` data table.
+
+        `tile_theme_names` maps zone theme paths (without the object name suffix) to their display names.
+        """
+        theater_names = {theater.get('uniqueId'): theater.get('displayName', {}).get('en') for theater in
+                         data.get('theaters', [])}
+        theater_tiles = {theater.get('uniqueId'): theater.get('tiles', []) for theater in data.get('theaters', [])}
+        theater_alerts = {theater.get('theaterId'): {
+            alert.get('tileIndex'): alert for alert in theater.get('availableMissionAlerts', [])
+        } for theater in data.get('missionAlerts', [])}
+
+        missions = []
+
+        for theater in data.get('missions', []):
+
+            theater_id = theater.get('theaterId')
+            theater_name = theater_names.get(theater_id) or 'Unknown Theater'
+            tiles = theater_tiles.get(theater_id, [])
+
+            # Alerts stay attached to the first mission on their tile
+            alerts = dict(theater_alerts.get(theater_id, {}))
+
+            for mission in theater.get('availableMissions', []):
+
+                tile_index = mission.get('tileIndex')
+                difficulty = mission.get('missionDifficultyInfo', {}).get('rowName')
+
+                try:
+                    tile_theme = tile_theme_names.get(tiles[tile_index]['zoneTheme'].split('.')[0], 'Unknown')
+                except (IndexError, KeyError, TypeError):
+                    tile_theme = 'Unknown'
+
+                try:
+                    power = difficulty_rows[difficulty]['ThreatDisplayName']['sourceString']
+                except (KeyError, TypeError):
+                    power = '0'
+
+                name = mission_name(mission.get('missionGenerator', ''))
+
+                alert_data = alerts.pop(tile_index, None)
+                alert, modifiers = None, []
+
+                if alert_data is not None:
+                    modifiers = [
+                        modifier.get('itemType', '').split(':')[-1]
+                        for modifier in alert_data.get('missionAlertModifiers', {}).get('items', [])
+                    ]
+                    alert = MissionAlert(
+                        name=name,
+                        power=power,
+                        theater=theater_name,
+                        tile_theme=tile_theme,
+                        alert_rewards_data=alert_data.get('missionAlertRewards', {}).get('items', [])
+                    )
+
+                missions.append(Mission(
+                    name=name,
+                    power=power,
+                    theater=theater_name,
+                    tile_index=tile_index,
+                    tile_theme=tile_theme,
+                    generator=mission.get('missionGenerator'),
+                    difficulty=difficulty,
+                    modifiers=modifiers,
+                    alert=alert
+                ))
+
+        return cls(missions)
+
+    def alerts(self) -> list[MissionAlert]:
+        return [mission.alert for mission in self.missions if mission.alert is not None]
+
+    def search(
+            self,
+            name: str = None,
+            theater: str = None,
+            tile_theme: str = None,
+            modifier: str = None,
+            min_power: int = None,
+            max_power: int = None
+    ) -> list[Mission]:
+        candidates = [self.missions]
+
+        for index, key in (
+                (self.by_name, name),
+                (self.by_theater, theater),
+                (self.by_tile_theme, tile_theme),
+                (self.by_modifier, modifier)
+        ):
+            if key is not None:
+                candidates.append(index.get(key, []))
+
+        if min_power is not None or max_power is not None:
+            low = self.power_band(min_power) if min_power is not None else None
+            candidates.append([
+                mission for band, missions in self.by_power_band.items()
+                if (low is None or band >= low) and (max_power is None or band <= max_power)
+                for mission in missions
+            ])
+
+        # Start from the smallest index and filter it down, rather than intersecting everything
+        results = min(candidates, key=len)
+
+        return sorted([
+            mission for mission in results
+            if (name is None or mission.name == name)
+            and (theater is None or mission.theater == theater)
+            and (tile_theme is None or mission.tile_theme == tile_theme)
+            and (modifier is None or modifier in mission.modifiers)
+            and (min_power is None or mission.power >= min_power)
+            and (max_power is None or mission.power <= max_power)
+        ], key=lambda mission: mission.power)
+
+
+class SubscriptionMatcher:
+
+    """
+    Matches a day's mission alerts against every user's alert subscriptions in a single pass.
+
+    A subscription is a dict of optional criteria: `name`, `category`, `rarity`, `min_quantity` and `min_power`.
+
+    Subscriptions are indexed by their (name, category, rarity) criteria, with `None` standing in for "any".
+
+    Item names are matched case-insensitively, since they are typed in by users.
+
+    Each reward then only needs to check the handful of index keys it could possibly match,
+    rather than every subscription being checked against every alert.
+    """
+
+    def __init__(
+            self,
+            subscriptions: Iterable[dict]
+    ):
+        self._index: dict[tuple[Optional[str], Optional[str], Optional[str]], list[dict]] = {}
+
+        for subscription in subscriptions:
+            key = (self._fold(subscription.get('name')), subscription.get('category'), subscription.get('rarity'))
+            self._index.setdefault(key, []).append(subscription)
+
+    @staticmethod
+    def _fold(name: Optional[str]) -> Optional[str]:
+        return name.casefold() if name is not None else None
+
+    def _candidates(self, name: str, category: str, rarity: str) -> Iterator[dict]:
+        for _name in (self._fold(name), None):
+            for _category in (category, None):
+                for _rarity in (rarity, None):
+                    yield from self._index.get((_name, _category, _rarity), ())
+
+    def match(self, snapshot: MissionAlertSnapshot) -> dict:
+        # Maps each subscription's `_id` to the subscription and the alerts it matched, in alert order
+        matches = {}
+
+        for alert in snapshot:
+            for reward in alert.alert_rewards:
+                for subscription in self._candidates(reward.name, reward.category, reward.rarity):
+
+                    if (reward.quantity or 0) < subscription.get('min_quantity', 0):
+                        continue
+                    if alert.power < subscription.get('min_power', 0):
+                        continue
+
+                    match = matches.setdefault(subscription['_id'], {'subscription': subscription, 'alerts': []})
+                    if not match['alerts'] or match['alerts'][-1] is not alert:
+                        match['alerts'].append(alert)
+
+        return matches
+
+
+def describe_subscription(subscription: dict) -> str:
+    criteria = []
+
+    if subscription.get('rarity') is not None:
+        criteria.append(subscription['rarity'].capitalize())
+    if subscription.get('name') is not None:
+        criteria.append(f'"{subscription["name"]}"')
+    elif subscription.get('category') is not None:
+        criteria.append(subscription['category'].capitalize())
+    else:
+        criteria.append('Any reward')
+
+    if subscription.get('min_quantity'):
+        criteria.append(f'x{subscription["min_quantity"]}+')
+    if subscription.get('min_power'):
+        criteria.append(f'at {subscription["min_power"]}+ power')
+
+    return ' '.join(criteria)
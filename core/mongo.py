@@ -1,9 +1,25 @@
 import logging
-from typing import Optional
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Optional, Iterable, AsyncIterator
 
 from certifi import where
-from pymongo import ReturnDocument
-from pymongo.errors import ConfigurationError, ServerSelectionTimeoutError
+from bson import ObjectId
+from pymongo import ReturnDocument, ReadPreference, ASCENDING, UpdateOne, InsertOne
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.errors import (
+    ConfigurationError,
+    ServerSelectionTimeoutError,
+    PyMongoError,
+    OperationFailure,
+    DuplicateKeyError,
+    BulkWriteError
+)
 from motor.motor_asyncio import (
     AsyncIOMotorClient,
     AsyncIOMotorDatabase,
@@ -11,6 +27,326 @@ from motor.motor_asyncio import (
     AsyncIOMotorClientSession
 )
 
+from core.cache import TTLCache
+
+
+class WriteBehindBuffer:
+
+    """
+    Batches frequent, latency-insensitive writes such as analytics and audit entries.
+
+    Updates to the same document are merged in memory, and everything is written with `bulk_write` once
+    `max_batch` documents are pending or every `flush_interval` seconds, whichever comes first.
+
+    Queueing a write never waits on the database. Once `max_pending` documents are waiting, writes to new documents
+    are dropped and counted instead, so a burst or an outage cannot grow the buffer without bound.
+    """
+
+    # Operators that can be merged without changing the result of applying the updates one after another
+    MERGEABLE_OPERATORS = ('$set', '$unset', '$inc', '$setOnInsert')
+
+    def __init__(
+            self,
+            max_batch: int = 500,
+            flush_interval: float = 5,
+            max_pending: int = 10000
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: OrderedDict[tuple, tuple[AsyncIOMotorCollection, Optional[dict], dict]] = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._inserts = 0
+
+        self._metrics = {
+            'queued': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+            'requeued': 0,
+            'flushes': 0,
+            'last_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0,
+            'last_error': None
+        }
+
+    @property
+    def metrics(self) -> dict:
+        return {**self._metrics, 'pending': len(self._pending)}
+
+    def start(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+        if self._pending:
+            logging.error(f'{len(self._pending)} buffered MongoDB write(s) could not be written before closing.')
+
+    @staticmethod
+    def _merge(older: dict, newer: dict) -> dict:
+        """
+        Merges two updates of the same document into one, with the same result as applying them in order.
+
+        Raises `ValueError` for an `$inc` of a field with a pending `$setOnInsert`, which no single update can express.
+        """
+        merged = {operator: dict(fields) for operator, fields in older.items()}
+
+        for operator, fields in newer.items():
+            # The older update has already created the document, so a later $setOnInsert would never apply
+            if operator == '$setOnInsert':
+                continue
+
+            for field, value in fields.items():
+                if operator == '$inc':
+                    if field in merged.get('$setOnInsert', {}):
+                        raise ValueError(f'Cannot merge an $inc of {field} into a pending $setOnInsert of it.')
+                    if field in merged.get('$set', {}):
+                        merged['$set'][field] += value
+                    elif field in merged.get('$unset', {}):
+                        # Incrementing a removed field starts it again from zero
+                        del merged['$unset'][field]
+                        merged.setdefault('$set', {})[field] = value
+                    else:
+                        merged.setdefault('$inc', {})
+                        merged['$inc'][field] = merged['$inc'].get(field, 0) + value
+                    continue
+
+                # A later $set/$unset of a field overrides whatever an earlier update did to it
+                for other in ('$set', '$unset', '$inc', '$setOnInsert'):
+                    merged.get(other, {}).pop(field, None)
+                merged.setdefault(operator, {})[field] = value
+
+        return {operator: fields for operator, fields in merged.items() if fields}
+
+    def _accept(self, key: tuple) -> bool:
+        if key in self._pending or len(self._pending) < self.max_pending:
+            return True
+        self._metrics['dropped'] += 1
+        return False
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.max_batch and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def update(self, collection: AsyncIOMotorCollection, query: dict, update: dict, upsert: bool = True) -> bool:
+        """
+        Queues an update of the document matching `query`, merging it into any update still pending for it.
+
+        Returns False if the buffer is full and the write was dropped.
+        """
+        unsupported = set(update) - set(self.MERGEABLE_OPERATORS)
+        if unsupported:
+            raise ValueError(f'Cannot buffer updates using {", ".join(sorted(unsupported))}.')
+
+        key = (collection.name, repr(sorted(query.items())), upsert)
+        if not self._accept(key):
+            return False
+
+        if key in self._pending:
+            update = self._merge(self._pending[key][2], update)
+            self._metrics['coalesced'] += 1
+
+        self._metrics['queued'] += 1
+
+        self._pending[key] = (collection, query, update)
+        self._schedule_flush()
+        return True
+
+    def insert(self, collection: AsyncIOMotorCollection, document: dict) -> bool:
+        """
+        Queues a new document, such as an audit entry. Inserts are never merged with each other.
+
+        Returns False if the buffer is full and the write was dropped.
+        """
+        self._inserts += 1
+        key = (collection.name, None, self._inserts)
+        if not self._accept(key):
+            return False
+
+        self._metrics['queued'] += 1
+        self._pending[key] = (collection, None, document)
+        self._schedule_flush()
+        return True
+
+    @staticmethod
+    def _operation(key: tuple, query: Optional[dict], payload: dict):
+        if query is None:
+            return InsertOne(payload)
+        return UpdateOne(query, payload, upsert=key[2])
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            # Only what is pending now is written, at most once, so writes queued during the flush (or a database
+            # that cannot be reached) cannot keep it going forever. Anything requeued waits for the next flush.
+            remaining = len(self._pending)
+            while self._pending and remaining > 0:
+                batch = []
+                while self._pending and len(batch) < min(self.max_batch, remaining):
+                    batch.append(self._pending.popitem(last=False))
+                remaining -= len(batch)
+
+                if await self._write_batch(batch) is False:
+                    break
+
+    async def _write_batch(self, batch: list) -> bool:
+        # Returns False if any of the batch had to be requeued
+        written = True
+        started = monotonic()
+        by_collection: dict[str, list] = {}
+        for entry in batch:
+            by_collection.setdefault(entry[0][0], []).append(entry)
+
+        for entries in by_collection.values():
+            collection = entries[0][1][0]
+            try:
+                await collection.bulk_write(
+                    [self._operation(key, query, payload) for key, (_, query, payload) in entries],
+                    ordered=False
+                )
+                self._metrics['written'] += len(entries)
+
+            except BulkWriteError as error:
+                # Individual operations were rejected by the server (e.g. a duplicate key), so retrying cannot help
+                failed = len(error.details.get('writeErrors', []))
+                self._metrics['written'] += len(entries) - failed
+                self._metrics['failed'] += failed
+                self._metrics['last_error'] = str(error)
+                logging.error(f'{failed} buffered write(s) to {collection.name} were rejected: {error}')
+
+            except PyMongoError as error:
+                # The database could not be reached, so the writes go back in the buffer for the next flush
+                self._metrics['last_error'] = str(error)
+                logging.error(f'Failed to flush {len(entries)} buffered write(s) to {collection.name}: {error}')
+                self._requeue(entries)
+                written = False
+
+        duration = monotonic() - started
+        self._metrics['flushes'] += 1
+        self._metrics['last_flush_seconds'] = duration
+        self._metrics['max_flush_seconds'] = max(self._metrics['max_flush_seconds'], duration)
+        return written
+
+    def _requeue(self, entries: list) -> None:
+        # Reversed, so that the batch ends up back at the front of the queue in its original order
+        for key, (collection, query, payload) in reversed(entries):
+            if key in self._pending:
+                # Anything queued since this batch was taken is newer, so it is merged on top of the failed update
+                try:
+                    payload = self._merge(payload, self._pending[key][2])
+                except ValueError as error:
+                    self._metrics['failed'] += 1
+                    logging.error(f'Dropped a failed buffered write to {collection.name}: {error}')
+                    continue
+            elif len(self._pending) >= self.max_pending:
+                self._metrics['dropped'] += 1
+                continue
+            self._pending[key] = (collection, query, payload)
+            self._pending.move_to_end(key, last=False)
+            self._metrics['requeued'] += 1
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as error:
+                logging.error(f'Unexpected error while flushing buffered MongoDB writes: {error}')
+
+
+class PoolMetrics(ConnectionPoolListener):
+
+    """
+    Tracks how long operations wait for a pooled connection, which shows when the pool is too small for the load.
+
+    PyMongo checks connections out on the executor threads that Motor runs operations on, so the events for
+    a single checkout always arrive on the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.checkouts = 0
+        self.failures: dict[str, int] = {}
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.open_connections = 0
+        self.pool_clears = 0
+
+    @property
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'failures': dict(self.failures),
+                'waiting': self.waiting,
+                'average_wait_ms': self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'open_connections': self.open_connections,
+                'pool_clears': self.pool_clears
+            }
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = monotonic()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event) -> None:
+        wait = monotonic() - getattr(self._local, 'started', monotonic())
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.failures[event.reason] = self.failures.get(event.reason, 0) + 1
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_checked_in(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+
+def available_compressors() -> list[str]:
+    # zstd and snappy need optional packages, while zlib is always available
+    compressors = [name for name, module in (('zstd', 'zstandard'), ('snappy', 'snappy')) if find_spec(module)]
+    return compressors + ['zlib']
+
 
 class MongoDBClient:
 
@@ -20,12 +356,37 @@ class MongoDBClient:
     This class can either be instantiated normally or by using an asynchronous context manager.
     """
 
-    def __init__(self, connection_uri: str):
+    def __init__(
+            self,
+            connection_uri: str,
+            cache_ttl: float = 60,
+            watch_changes: bool = False,
+            write_batch_size: int = 500,
+            write_flush_interval: float = 5,
+            max_pool_size: int = 100,
+            min_pool_size: int = 0,
+            max_idle_time_ms: Optional[int] = 300000,
+            wait_queue_timeout_ms: Optional[int] = 5000,
+            connect_timeout_ms: int = 5000,
+            socket_timeout_ms: Optional[int] = 20000,
+            server_selection_timeout_ms: int = 3000,
+            compressors: Optional[list[str]] = None
+    ):
+        self.pool_metrics = PoolMetrics()
+
         try:
             self.client: AsyncIOMotorClient = AsyncIOMotorClient(
                 connection_uri,
                 tlsCAFile=where(),
-                serverSelectionTimeoutMS=3000
+                maxPoolSize=max_pool_size,
+                minPoolSize=min_pool_size,
+                maxIdleTimeMS=max_idle_time_ms,
+                waitQueueTimeoutMS=wait_queue_timeout_ms,
+                connectTimeoutMS=connect_timeout_ms,
+                socketTimeoutMS=socket_timeout_ms,
+                serverSelectionTimeoutMS=server_selection_timeout_ms,
+                compressors=available_compressors() if compressors is None else compressors,
+                event_listeners=[self.pool_metrics]
             )
 
         except ConfigurationError:
@@ -36,56 +397,248 @@ class MongoDBClient:
 
         self.userdata: AsyncIOMotorCollection = self.database.userdata
         self.settings: AsyncIOMotorCollection = self.database.settings
+        self.missions: AsyncIOMotorCollection = self.database.missions
+        self.mission_history: AsyncIOMotorCollection = self.database.mission_history
+        self.subscriptions: AsyncIOMotorCollection = self.database.subscriptions
+        self.command_usage: AsyncIOMotorCollection = self.database.command_usage
+
+        # Settings and userdata lookups can be served by a secondary, since a user's own writes are read causally
+        self._settings_reads = self.settings.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+        self._userdata_reads = self.userdata.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
 
-        self._session = None
+        # The cluster/operation time of each user's latest write, so their next read waits for it to replicate
+        self._causal_tokens = TTLCache(ttl=cache_ttl, max_size=10000)
+
+        # Settings and userdata are read by every command check, but only change when a user updates them
+        self._settings_cache = TTLCache(ttl=cache_ttl, max_size=10000)
+        self._userdata_cache = TTLCache(ttl=cache_ttl, max_size=10000)
+
+        # Change streams let other processes' writes invalidate our cache, but require a replica set
+        self._watch_changes = watch_changes
+        self._change_watcher: Optional[asyncio.Task] = None
+
+        # High-frequency writes that nothing reads back straight away go through here instead of a query each
+        self.write_buffer = WriteBehindBuffer(max_batch=write_batch_size, flush_interval=write_flush_interval)
 
     async def __aenter__(self):
         try:
-            self._session: AsyncIOMotorClientSession = await self.client.start_session()
+            await self.ensure_indexes()
         except ServerSelectionTimeoutError:
             logging.fatal('Failed to connect to MongoDB. Please check your credentials.')
             raise SystemExit()
+
+        if self._watch_changes is True:
+            self._change_watcher = asyncio.create_task(self._watch_cache_invalidations())
+
+        self.write_buffer.start()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> bool:
-        await self._session.end_session()
+        if self._change_watcher is not None:
+            self._change_watcher.cancel()
+        await self.write_buffer.close()
         return False
 
+    @asynccontextmanager
+    async def _causal_session(
+            self,
+            discord_id: int,
+            write: bool = False
+    ) -> AsyncIterator[Optional[AsyncIOMotorClientSession]]:
+        """
+        Yields a causally consistent session for operations on a single user's documents.
+
+        Reads only get a session if the user wrote something recently, so everyone else's reads stay independent.
+        Writes always get one, and remember its cluster and operation time for the user's next read.
+        """
+        token = self._causal_tokens.peek(discord_id)
+        if token is None and write is False:
+            yield None
+            return
+
+        async with await self.client.start_session(causal_consistency=True) as session:
+            if token is not None:
+                session.advance_cluster_time(token['cluster_time'])
+                session.advance_operation_time(token['operation_time'])
+
+            yield session
+
+            # Standalone servers don't report these, and don't need them either as there is nothing to replicate to
+            if write is True and session.cluster_time is not None and session.operation_time is not None:
+                self._causal_tokens.put(
+                    discord_id,
+                    {'cluster_time': session.cluster_time, 'operation_time': session.operation_time}
+                )
+
+    async def _watch_cache_invalidations(self) -> None:
+        caches = {'settings': self._settings_cache, 'userdata': self._userdata_cache}
+        pipeline = [{'$match': {'ns.coll': {'$in': list(caches)}}}]
+
+        try:
+            async with self.database.watch(pipeline, full_document='updateLookup') as stream:
+                async for change in stream:
+                    cache = caches[change['ns']['coll']]
+                    document = change.get('fullDocument')
+
+                    # Deleted documents no longer carry their Discord ID, so the whole cache has to go
+                    if document is None:
+                        cache.clear()
+                    else:
+                        cache.invalidate(document.get('discord_id'))
+
+        except PyMongoError as error:
+            logging.error(f'Stopped watching MongoDB for cache invalidations: {error}')
+
+    async def ensure_indexes(self) -> None:
+        await self.missions.create_index('day', unique=True)
+
+        # History queries always filter on a date range, usually alongside a category/theater or a specific item
+        await self.mission_history.create_index([('day', ASCENDING)])
+        await self.mission_history.create_index([('category', ASCENDING), ('theater', ASCENDING), ('day', ASCENDING)])
+        await self.mission_history.create_index([('template_id', ASCENDING), ('day', ASCENDING)])
+        await self.mission_history.create_index([('name', ASCENDING), ('day', ASCENDING)])
+        await self.mission_history.create_index([('rarity', ASCENDING), ('day', ASCENDING)])
+
+        await self.subscriptions.create_index('discord_id')
+        await self.command_usage.create_index([('discord_id', ASCENDING), ('command', ASCENDING)])
+
+        # One settings/userdata document per user, which also makes get-or-create upserts race-free
+        for collection in (self.settings, self.userdata):
+            try:
+                await collection.create_index('discord_id', unique=True)
+            except OperationFailure as error:
+                logging.error(f'Could not create a unique index on {collection.name}.discord_id: {error}')
+
+    @staticmethod
+    def _defaults_projection(defaults: dict) -> dict:
+        # Documents created before a field was added are missing it, so the projection fills in its default
+        return {'_id': False, **{key: {'$ifNull': [f'${key}', value]} for key, value in defaults.items()}}
+
+    async def _get_or_create(
+            self,
+            collection: AsyncIOMotorCollection,
+            reads: AsyncIOMotorCollection,
+            defaults: dict
+    ) -> dict:
+        query = {'discord_id': defaults['discord_id']}
+        projection = self._defaults_projection(defaults)
+
+        # Almost every user already has a document, which a secondary can return without touching the primary
+        async with self._causal_session(defaults['discord_id']) as session:
+            document = await reads.find_one(query, projection, session=session)
+        if document is not None:
+            return document
+
+        update = {'$setOnInsert': {key: value for key, value in defaults.items() if key not in query}}
+
+        for attempt in range(2):
+            try:
+                return await collection.find_one_and_update(
+                    query,
+                    update,
+                    upsert=True,
+                    projection=projection,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Two upserts for the same new user raced - the loser just retries and reads the winner's document
+                if attempt == 1:
+                    raise
+
     @staticmethod
     def _default_settings(discord_id: int) -> dict:
         return {
             'discord_id': discord_id,
             'stay_signed_in': True,
             'auto_research': False,
-            'auto_free_llamas': False
+            'auto_free_llamas': False,
+            'prefetch_profile': False
         }
 
     async def search_settings_entry(self, discord_id: int) -> dict:
-        data = await self.settings.find_one({'discord_id': discord_id}, session=self._session)
+        return await self._settings_cache.get_or_load(discord_id, lambda: self._search_settings_entry(discord_id))
 
-        if data is None:
-            default = self._default_settings(discord_id)
-            await self.settings.insert_one(default, session=self._session)
-            return default
+    async def _search_settings_entry(self, discord_id: int) -> dict:
+        return await self._get_or_create(self.settings, self._settings_reads, self._default_settings(discord_id))
 
-        return data
+    async def bulk_settings(self, discord_ids: Iterable[int]) -> dict[int, dict]:
+        """
+        Fetches the settings of many users at once, for background jobs that run over every logged-in user.
 
-    async def update_settings_entry(self, discord_id: int, **kwargs) -> Optional[dict]:
-        return await self.settings.find_one_and_update(
-            {'discord_id': discord_id},
-            {'$set': kwargs},
-            return_document=ReturnDocument.AFTER,
-            session=self._session
+        Cached settings are used where possible, and everything else is read with a single `$in` query.
+
+        Users without a settings document get the defaults, which are created in one bulk write.
+        """
+        results = {}
+        missing = []
+
+        for discord_id in set(discord_ids):
+            cached = self._settings_cache.peek(discord_id)
+            if cached is not None:
+                results[discord_id] = cached
+            else:
+                missing.append(discord_id)
+
+        if not missing:
+            return results
+
+        defaults = self._default_settings(0)
+        cursor = self._settings_reads.find(
+            {'discord_id': {'$in': missing}},
+            projection=self._defaults_projection(defaults)
         )
+        async for document in cursor:
+            results[document['discord_id']] = document
+            self._settings_cache.put(document['discord_id'], document)
+
+        new_ids = [discord_id for discord_id in missing if discord_id not in results]
+        if new_ids:
+            on_insert = {key: value for key, value in defaults.items() if key != 'discord_id'}
+            result = await self.settings.bulk_write([
+                UpdateOne({'discord_id': discord_id}, {'$setOnInsert': on_insert}, upsert=True)
+                for discord_id in new_ids
+            ], ordered=False)
+
+            # Only the documents we actually inserted have the defaults
+            inserted = {new_ids[index] for index in result.upserted_ids}
+            for discord_id in inserted:
+                results[discord_id] = self._default_settings(discord_id)
+                self._settings_cache.put(discord_id, results[discord_id])
+
+            # The rest already existed but had not replicated to the secondary yet, so they are read from the primary
+            existing = [discord_id for discord_id in new_ids if discord_id not in inserted]
+            if existing:
+                cursor = self.settings.find(
+                    {'discord_id': {'$in': existing}},
+                    projection=self._defaults_projection(defaults)
+                )
+                async for document in cursor:
+                    results[document['discord_id']] = document
+                    self._settings_cache.put(document['discord_id'], document)
+
+        return results
+
+    async def update_settings_entry(self, discord_id: int, **kwargs) -> Optional[dict]:
+        self._settings_cache.invalidate(discord_id)
+        async with self._causal_session(discord_id, write=True) as session:
+            data = await self.settings.find_one_and_update(
+                {'discord_id': discord_id},
+                {'$set': kwargs},
+                projection=self._defaults_projection(self._default_settings(discord_id)),
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        if data is not None:
+            self._settings_cache.put(discord_id, data)
+        return data
 
     async def delete_settings_entry(self, discord_id: int) -> Optional[dict]:
-        return await self.settings.find_one_and_delete(
-            {'discord_id': discord_id},
-            session=self._session
-        )
+        self._settings_cache.invalidate(discord_id)
+        async with self._causal_session(discord_id, write=True) as session:
+            return await self.settings.find_one_and_delete({'discord_id': discord_id}, session=session)
 
     @staticmethod
-    def _default_userdata(discord_id: int):
+    def _default_userdata(discord_id: int) -> dict:
         return {
             'discord_id': discord_id,
             'premium': False,
@@ -93,25 +646,96 @@ class MongoDBClient:
         }
 
     async def search_userdata_entry(self, discord_id: int) -> dict:
-        data = await self.userdata.find_one({'discord_id': discord_id}, session=self._session)
+        return await self._userdata_cache.get_or_load(discord_id, lambda: self._search_userdata_entry(discord_id))
 
-        if data is None:
-            default = self._default_userdata(discord_id)
-            await self.userdata.insert_one(default, session=self._session)
-            return default
+    async def _search_userdata_entry(self, discord_id: int) -> dict:
+        return await self._get_or_create(self.userdata, self._userdata_reads, self._default_userdata(discord_id))
 
+    async def update_userdata_entry(self, discord_id: int, **kwargs) -> Optional[dict]:
+        self._userdata_cache.invalidate(discord_id)
+        async with self._causal_session(discord_id, write=True) as session:
+            data = await self.userdata.find_one_and_update(
+                {'discord_id': discord_id},
+                {'$set': kwargs},
+                projection=self._defaults_projection(self._default_userdata(discord_id)),
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        if data is not None:
+            self._userdata_cache.put(discord_id, data)
         return data
 
-    async def update_userdata_entry(self, discord_id: int, **kwargs) -> Optional[dict]:
-        return await self.userdata.find_one_and_update(
-            {'discord_id': discord_id},
-            {'$set': kwargs},
-            return_document=ReturnDocument.AFTER,
-            session=self._session
+    async def delete_userdata_entry(self, discord_id: int) -> Optional[dict]:
+        self._userdata_cache.invalidate(discord_id)
+        async with self._causal_session(discord_id, write=True) as session:
+            return await self.userdata.find_one_and_delete({'discord_id': discord_id}, session=session)
+
+    async def get_mission_snapshot(self, day: str) -> Optional[dict]:
+        return await self.missions.find_one({'day': day}, {'_id': False})
+
+    async def save_mission_snapshot(self, data: dict) -> None:
+        await self.missions.replace_one({'day': data['day']}, data, upsert=True)
+
+    async def archive_mission_history(self, rows: list[dict]) -> bool:
+        # The archive is append-only, so a day that has already been archived is left untouched
+        if not rows or await self.mission_history.find_one({'day': rows[0]['day']}, {'_id': True}) is not None:
+            return False
+        await self.mission_history.insert_many(rows, ordered=False)
+        return True
+
+    async def mission_history_summary(
+            self,
+            start: datetime,
+            end: datetime,
+            theater: str = None,
+            category: str = None,
+            rarity: str = None,
+            name: str = None,
+            template_id: str = None
+    ) -> dict:
+        query = {'day': {'$gte': start, '$lt': end}}
+        filters = {'theater': theater, 'category': category, 'rarity': rarity, 'name': name, 'template_id': template_id}
+        query.update({key: value for key, value in filters.items() if value is not None})
+
+        pipeline = [
+            {'$match': query},
+            {'$group': {
+                '_id': None,
+                'rewards': {'$sum': 1},
+                'quantity': {'$sum': '$quantity'},
+                'days': {'$addToSet': '$day'},
+                'first_seen': {'$min': '$day'},
+                'last_seen': {'$max': '$day'}
+            }},
+            {'$project': {'_id': False, 'rewards': True, 'quantity': True, 'days': {'$size': '$days'},
+                          'first_seen': True, 'last_seen': True}}
+        ]
+
+        async for result in self.mission_history.aggregate(pipeline):
+            return result
+        return {'rewards': 0, 'quantity': 0, 'days': 0, 'first_seen': None, 'last_seen': None}
+
+    def record_command_use(self, discord_id: int, command: str) -> bool:
+        # Written once per command, so it goes through the write buffer rather than costing a query every time
+        now = datetime.utcnow()
+        return self.write_buffer.update(
+            self.command_usage,
+            {'discord_id': discord_id, 'command': command},
+            {'$inc': {'uses': 1}, '$set': {'last_used': now}, '$setOnInsert': {'first_used': now}}
         )
 
-    async def delete_userdata_entry(self, discord_id: int) -> Optional[dict]:
-        return await self.userdata.find_one_and_delete(
-            {'discord_id': discord_id},
-            session=self._session
+    async def add_subscription(self, discord_id: int, channel_id: Optional[int] = None, **criteria) -> dict:
+        subscription = {'discord_id': discord_id, 'channel_id': channel_id, **criteria}
+        await self.subscriptions.insert_one(subscription)
+        return subscription
+
+    async def get_subscriptions(self, discord_id: int) -> list[dict]:
+        return await self.subscriptions.find({'discord_id': discord_id}).to_list(length=None)
+
+    async def all_subscriptions(self) -> list[dict]:
+        return await self.subscriptions.find({}).to_list(length=None)
+
+    async def delete_subscription(self, discord_id: int, subscription_id: ObjectId) -> Optional[dict]:
+        return await self.subscriptions.find_one_and_delete(
+            {'_id': subscription_id, 'discord_id': discord_id}
         )
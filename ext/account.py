@@ -4,7 +4,7 @@ from main import STWBot
 from core.errors import STWException
 from components.embed import CustomEmbed, EmbedField
 from components.login import StaticLoginView
-from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
+from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown, prefetches_profile
 from resources.emojis import emojis
 
 
@@ -54,6 +54,21 @@ class AccountCommands(app_commands.Group):
         await self.bot.del_auth_session(interaction.user.id)
         await self.bot.basic_response(interaction, 'Successfully logged out.')
 
+    @non_premium_cooldown()
+    @is_not_blacklisted()
+    @app_commands.describe(enabled='Whether to load your profile in the background when you log in or use a command.')
+    @app_commands.command(name='prefetch', description='Make inventory commands faster by loading your profile early.')
+    async def prefetch(self, interaction: Interaction, enabled: bool):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        # Makes sure the settings document exists, since updates do not create one
+        await self.bot.mongo_db.search_settings_entry(interaction.user.id)
+        await self.bot.mongo_db.update_settings_entry(interaction.user.id, prefetch_profile=enabled)
+        await self.bot.basic_response(
+            interaction,
+            f'Profile prefetching is now {"enabled" if enabled is True else "disabled"}.'
+        )
+
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -61,13 +76,14 @@ class AccountCommands(app_commands.Group):
     async def info(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        account = await self.bot.get_full_account(interaction.user.id)
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, icon_url = await auth.load_account(None, 'icon')
 
         info_embed = CustomEmbed(
             interaction,
             description=interaction.user.mention
         )
-        info_embed.set_author(name='Epic Account Info', icon_url=await account.icon_url())
+        info_embed.set_author(name='Epic Account Info', icon_url=icon_url)
         info_embed.set_footer(text='Do not share any sensitive information with anyone!')
 
         info_embed.add_field(
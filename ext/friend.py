@@ -1,10 +1,15 @@
+import asyncio
+import logging
+from math import ceil
+
 from discord import app_commands, Interaction
 
 from main import STWBot
-from core.accounts import FriendEpicAccount
-from components.embed import EmbedField
+from core.accounts import PartialEpicAccount, FriendEpicAccount, FullEpicAccount
+from core.errors import NotFound, HTTPException
+from components.embed import EmbedField, CustomEmbed
 from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
-from components.paginator import Paginator
+from components.paginator import LazyPaginator
 from resources.emojis import emojis
 
 
@@ -19,13 +24,7 @@ class FriendCommands(app_commands.Group):
         super().__init__(name=name)
         self.bot = bot
 
-    async def friends_to_fields(self, interaction: Interaction, friend_type: str = 'friends') -> dict:
-        await interaction.response.defer(thinking=True, ephemeral=True)
-
-        account = await self.bot.get_full_account(interaction.user.id)
-        friends = await account.friends_list(friend_type)
-        icon_url = await account.icon_url()
-
+    def friends_to_fields(self, friends: list[PartialEpicAccount]) -> list[EmbedField]:
         field_list = []
 
         for friend in friends:
@@ -44,82 +43,73 @@ class FriendCommands(app_commands.Group):
 
             field_list.append(field)
 
-        return {'fields': field_list, 'icon_url': icon_url}
+        return field_list
+
+    async def send_friends(self, interaction: Interaction, author_name: str, friend_type: str = 'friends') -> None:
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        account = await self.bot.get_full_account(interaction.user.id)
+        friends, icon_url = await asyncio.gather(
+            account.friends_list(friend_type, resolve_names=False),
+            account.icon_url()
+        )
+
+        # Display names are only resolved for the page being shown, so the first page needs one lookup at most
+        page_size = 6
+        page_count = ceil(len(friends) / page_size)
+
+        async def load_page(index: int) -> CustomEmbed:
+            page = friends[index * page_size:(index + 1) * page_size]
+            await account.resolve_display_names(page)
+
+            embed = self.bot.fields_to_embeds(
+                interaction,
+                self.friends_to_fields(page),
+                description=interaction.user.mention,
+                author_name=author_name,
+                author_icon=icon_url,
+                field_limit=page_size
+            )[0]
+            embed.set_footer(text=f'Page {index + 1} of {max(page_count, 1)}')
+            return embed
+
+        paginator = LazyPaginator(interaction, page_count, load_page)
+        await interaction.followup.send(embed=await paginator.first_page(), view=paginator)
 
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
     @app_commands.command(name='list', description='View your friends list.')
     async def list(self, interaction: Interaction):
-        embed_data = await self.friends_to_fields(interaction)
-        embed_list = self.bot.fields_to_embeds(
-            interaction,
-            embed_data['fields'],
-            description=interaction.user.mention,
-            author_name='Friends List',
-            author_icon=embed_data['icon_url']
-        )
-        await interaction.followup.send(embed=embed_list[0], view=Paginator(interaction, embed_list))
+        await self.send_friends(interaction, 'Friends List')
 
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
     @app_commands.command(name='incoming', description='View your incoming friend requests.')
     async def incoming(self, interaction: Interaction):
-        embed_data = await self.friends_to_fields(interaction, friend_type='incoming')
-        embed_list = self.bot.fields_to_embeds(
-            interaction,
-            embed_data['fields'],
-            description=interaction.user.mention,
-            author_name='Incoming Requests',
-            author_icon=embed_data['icon_url']
-        )
-        await interaction.followup.send(embed=embed_list[0], view=Paginator(interaction, embed_list))
+        await self.send_friends(interaction, 'Incoming Requests', friend_type='incoming')
 
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
     @app_commands.command(name='outgoing', description='View your outgoing friend requests.')
     async def outgoing(self, interaction: Interaction):
-        embed_data = await self.friends_to_fields(interaction, friend_type='outgoing')
-        embed_list = self.bot.fields_to_embeds(
-            interaction,
-            embed_data['fields'],
-            description=interaction.user.mention,
-            author_name='Outgoing Requests',
-            author_icon=embed_data['icon_url']
-        )
-        await interaction.followup.send(embed=embed_list[0], view=Paginator(interaction, embed_list))
+        await self.send_friends(interaction, 'Outgoing Requests', friend_type='outgoing')
 
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
     @app_commands.command(name='suggested', description='View your suggested friends list.')
     async def suggested(self, interaction: Interaction):
-        embed_data = await self.friends_to_fields(interaction, friend_type='suggested')
-        embed_list = self.bot.fields_to_embeds(
-            interaction,
-            embed_data['fields'],
-            description=interaction.user.mention,
-            author_name='Suggested Friends',
-            author_icon=embed_data['icon_url']
-        )
-        await interaction.followup.send(embed=embed_list[0], view=Paginator(interaction, embed_list))
+        await self.send_friends(interaction, 'Suggested Friends', friend_type='suggested')
 
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
     @app_commands.command(name='blocklist', description='View your list of blocked users.')
     async def blocklist(self, interaction: Interaction):
-        embed_data = await self.friends_to_fields(interaction, friend_type='blocklist')
-        embed_list = self.bot.fields_to_embeds(
-            interaction,
-            embed_data['fields'],
-            description=interaction.user.mention,
-            author_name='Blocked Users',
-            author_icon=embed_data['icon_url']
-        )
-        await interaction.followup.send(embed=embed_list[0], view=Paginator(interaction, embed_list))
+        await self.send_friends(interaction, 'Blocked Users', friend_type='blocklist')
 
     @non_premium_cooldown()
     @is_logged_in()
@@ -185,6 +175,146 @@ class FriendCommands(app_commands.Group):
 
         await self.bot.basic_response(interaction, f'Successfully unblocked `{friend_account.display}`.')
 
+    async def run_batch(
+            self,
+            interaction: Interaction,
+            account: FullEpicAccount,
+            operation: str,
+            epic_ids: list[str],
+            verb: str,
+            note: str = ''
+    ) -> None:
+        if not epic_ids:
+            await self.bot.basic_response(interaction, 'No matching accounts were found.')
+            return
+
+        completed = 0
+
+        def on_progress(done: int, total: int):
+            nonlocal completed
+            completed = done
+
+        def progress_embed(message: str) -> CustomEmbed:
+            return CustomEmbed(interaction, description=message)
+
+        async def report_progress():
+            # The response is edited every few seconds, rather than after every single request
+            while True:
+                await asyncio.sleep(2)
+                await interaction.edit_original_response(
+                    embed=progress_embed(f'{verb} `{completed}` of `{len(epic_ids)}` account(s)...')
+                )
+
+        await self.bot.basic_response(interaction, f'{verb} `0` of `{len(epic_ids)}` account(s)...')
+
+        reporter = asyncio.create_task(report_progress())
+        try:
+            results = await account.batch_friend_operation(operation, epic_ids, on_progress=on_progress)
+        finally:
+            reporter.cancel()
+            # Waiting for the reporter to stop means an error it stopped with, such as Discord rejecting an edit,
+            # is retrieved and logged instead of being lost with the task
+            await asyncio.wait([reporter])
+            if not reporter.cancelled() and reporter.exception() is not None:
+                logging.error(f'Stopped reporting batch progress: {reporter.exception()!r}')
+
+        summary = f'Finished! {verb} `{len(results["succeeded"])}` of `{len(epic_ids)}` account(s).'
+        if results['failed']:
+            summary += f'\n`{len(results["failed"])}` could not be completed.'
+        await interaction.edit_original_response(embed=progress_embed(summary + note))
+
+    @non_premium_cooldown()
+    @is_logged_in()
+    @is_not_blacklisted()
+    @app_commands.command(name='accept-all', description='Accept all of your incoming friend requests.')
+    async def accept_all(self, interaction: Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        account = await self.bot.get_full_account(interaction.user.id)
+        incoming = await account.friends_list('incoming', resolve_names=False)
+
+        await self.run_batch(interaction, account, 'add', [friend.id for friend in incoming], 'Accepted')
+
+    @non_premium_cooldown()
+    @is_logged_in()
+    @is_not_blacklisted()
+    @app_commands.command(name='decline-all', description='Decline all of your incoming friend requests.')
+    async def decline_all(self, interaction: Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        account = await self.bot.get_full_account(interaction.user.id)
+        incoming = await account.friends_list('incoming', resolve_names=False)
+
+        await self.run_batch(interaction, account, 'remove', [friend.id for friend in incoming], 'Declined')
+
+    @non_premium_cooldown()
+    @is_logged_in()
+    @is_not_blacklisted()
+    @app_commands.describe(
+        name_filter='Remove friends whose display name contains this text.',
+        no_mutuals='Only remove friends you have no mutual friends with.')
+    @app_commands.command(name='prune', description='Remove every friend matching a filter from your friends list.')
+    async def prune(self, interaction: Interaction, name_filter: str = None, no_mutuals: bool = False):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        if name_filter is None and no_mutuals is False:
+            await self.bot.bad_response(interaction, 'Please provide a name filter and/or enable `no_mutuals`.')
+            return
+
+        account = await self.bot.get_full_account(interaction.user.id)
+
+        # Names are only needed when filtering by them, in which case the whole list is resolved in bulk
+        friends = await account.friends_list(resolve_names=name_filter is not None)
+
+        matches = [
+            friend.id for friend in friends
+            if (name_filter is None or name_filter.casefold() in (friend.display or '').casefold())
+            and (no_mutuals is False or friend.mutual == 0)
+        ]
+
+        await self.run_batch(interaction, account, 'remove', matches, 'Removed')
+
+    @non_premium_cooldown()
+    @is_logged_in()
+    @is_not_blacklisted()
+    @app_commands.describe(displays='Epic account display names, separated by commas.')
+    @app_commands.command(name='block-many', description='Block several Epic Games users at once.')
+    async def block_many(self, interaction: Interaction, displays: str):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        auth_session = self.bot.get_auth_session(interaction.user.id)
+        account = await auth_session.get_own_account()
+
+        async def lookup(display: str) -> PartialEpicAccount:
+            # Display names are looked up one at a time, under the same limit as bulk lookups so a long list of
+            # names cannot flood Epic with requests (most will already be in the shared name cache anyway)
+            async with auth_session.client.account_lookup_limit:
+                return await auth_session.get_other_account(display=display)
+
+        names = [display.strip() for display in displays.split(',') if display.strip()]
+        lookups = await asyncio.gather(*[lookup(display) for display in names], return_exceptions=True)
+
+        # A name that could not be looked up (e.g. rate limited) is reported rather than failing the whole batch
+        unknown = [display for display, result in zip(names, lookups) if isinstance(result, NotFound)]
+        failed = [display for display, result in zip(names, lookups)
+                  if isinstance(result, HTTPException) and not isinstance(result, NotFound)]
+        for result in lookups:
+            if isinstance(result, BaseException) and not isinstance(result, HTTPException):
+                raise result
+
+        note = f'\nCould not find: `{"`, `".join(unknown)}`.' if unknown else ''
+        if failed:
+            note += f'\nCould not look up (please try again later): `{"`, `".join(failed)}`.'
+
+        await self.run_batch(
+            interaction,
+            account,
+            'block',
+            [result.id for result in lookups if isinstance(result, PartialEpicAccount)],
+            'Blocked',
+            note=note
+        )
+
 
 async def setup(bot: STWBot):
     bot.tree.add_command(FriendCommands(bot))
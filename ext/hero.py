@@ -4,7 +4,7 @@ from main import STWBot
 from core.errors import STWException
 from core.fortnite import Hero
 from components.embed import EmbedField
-from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
+from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown, prefetches_profile
 from components.paginator import Paginator
 from components.itemselect import RecycleSelectionMenu, UpgradeSelectionMenu
 from resources.emojis import emojis
@@ -41,6 +41,7 @@ class HeroCommands(app_commands.Group):
 
         return embed_fields
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -50,8 +51,8 @@ class HeroCommands(app_commands.Group):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         auth = self.bot.get_auth_session(interaction.user.id)
-        account = await auth.get_other_account(display=display) if display is not None else await auth.get_own_account()
-        heroes = [hero for hero in await account.heroes() if name.lower() in hero.name.lower()]
+        account, heroes, icon_url = await auth.load_account(display, 'heroes', 'icon')
+        heroes = [hero for hero in heroes if name.lower() in hero.name.lower()]
 
         if not heroes:
             raise STWException(f'Hero `{name}` not found.')
@@ -62,11 +63,12 @@ class HeroCommands(app_commands.Group):
             embed_fields,
             description=f'**IGN:** `{account.display}`',
             author_name='All Heroes',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -78,8 +80,9 @@ class HeroCommands(app_commands.Group):
         if level not in range(2, 61):
             raise STWException(f'Level `{level}` is invalid, please try again.')
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        heroes = [hero for hero in await account.heroes() if name.lower() in hero.name.lower()]
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, heroes, icon_url = await auth.load_account(None, 'heroes', 'icon')
+        heroes = [hero for hero in heroes if name.lower() in hero.name.lower()]
 
         if not heroes:
             raise STWException(f'Hero `{name}` not found.')
@@ -90,7 +93,7 @@ class HeroCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Upgrade Heroes',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
@@ -104,6 +107,7 @@ class HeroCommands(app_commands.Group):
 
         await interaction.followup.send(embed=embeds[0], view=view)
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -112,8 +116,9 @@ class HeroCommands(app_commands.Group):
     async def recycle(self, interaction: Interaction, name: str = ''):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        heroes = [hero for hero in await account.heroes() if name.lower() in hero.name.lower()]
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, heroes, icon_url = await auth.load_account(None, 'heroes', 'icon')
+        heroes = [hero for hero in heroes if name.lower() in hero.name.lower()]
 
         if not heroes:
             raise STWException(f'Hero `{name}` not found.')
@@ -124,7 +129,7 @@ class HeroCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Recycle Heroes',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
@@ -1,13 +1,15 @@
-from typing import Optional
+from typing import Optional, Iterable
 
 from discord import app_commands, Interaction
 
 from main import STWBot
-from core.fortnite import MissionAlert
+from core.fortnite import MissionAlert, Mission
+from core.errors import STWException
 from components.embed import EmbedField
 from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
 from components.paginator import Paginator
 from resources.emojis import emojis
+from resources.lookup import stringList
 
 
 # noinspection PyUnresolvedReferences
@@ -23,7 +25,7 @@ class MissionCommands(app_commands.Group):
         self.theater_list = ['Stonewood', 'Plankerton', 'Canny Valley', 'Twine Peaks']
 
     @staticmethod
-    def missions_to_fields(missions: list[MissionAlert], include_theater: bool = False) -> list[EmbedField]:
+    def missions_to_fields(missions: Iterable[MissionAlert], include_theater: bool = False) -> list[EmbedField]:
         embed_fields = []
 
         for mission in missions:
@@ -45,6 +47,30 @@ class MissionCommands(app_commands.Group):
 
         return embed_fields
 
+    @staticmethod
+    def world_missions_to_fields(missions: Iterable[Mission]) -> list[EmbedField]:
+        embed_fields = []
+
+        for mission in missions:
+
+            modifiers_str = ', '.join(mission.modifiers) or 'None'
+            rewards_str = '\n'.join(
+                [f'> {reward.emoji} `{reward.name} x{reward.quantity}`' for reward in mission.alert.alert_rewards]
+            ) if mission.alert is not None else '> `None`'
+
+            embed_field = EmbedField(
+                name=f'{emojis["mission_icons"].get(mission.name, emojis["mission_icons"]["Unknown Mission"])} '
+                     f'{mission.name} ({mission.theater})',
+                value=f'> {emojis["power"]} **Power Rating:** `{mission.power}`\n'
+                      f'> {emojis["tile_theme"]} **Zone Theme:** `{mission.tile_theme}`\n'
+                      f'> {emojis["red_skull"]} **Modifiers:** `{modifiers_str}`\n'
+                      f'> {emojis["loot"]} **Alert Rewards:**\n{rewards_str}'
+            )
+
+            embed_fields.append(embed_field)
+
+        return embed_fields
+
     def order_theaters(self, theaters: set[Optional[str]]):
         ordered_list = []
 
@@ -71,22 +97,22 @@ class MissionCommands(app_commands.Group):
     async def alert(self, interaction: Interaction, theater: app_commands.Choice[str] = None):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        missions = await self.bot.missions()
+        snapshot = await self.bot.missions()
 
         if theater is None:
-            pass
+            theaters = set(snapshot.by_theater)
         elif theater.name == 'Ventures':
-            missions = [mission for mission in missions if mission.theater not in self.theater_list]
+            theaters = set(name for name in snapshot.by_theater if name not in self.theater_list)
         else:
-            missions = [mission for mission in missions if mission.theater == theater.name]
+            theaters = {theater.name} & set(snapshot.by_theater)
 
         # Chunk missions based on theater name to produce a chapter-like effect in our embed pages
         embed_list = []
-        theater_list = self.order_theaters(set(mission.theater for mission in missions))
+        theater_list = self.order_theaters(theaters)
         for theater in theater_list:
 
-            theater_missions = [mission for mission in missions if mission.theater == theater]
-            theater_missions.sort(key=lambda m: m.power)
+            # Already sorted by power when the snapshot was built
+            theater_missions = snapshot.by_theater[theater]
 
             embed_fields = self.missions_to_fields(theater_missions)
             embeds = self.bot.fields_to_embeds(
@@ -112,17 +138,10 @@ class MissionCommands(app_commands.Group):
     async def vbucks(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        missions = await self.bot.missions()
-
-        vbuck_missions = []
-        vbuck_count = 0
+        snapshot = await self.bot.missions()
 
-        for mission in missions:
-            for reward in mission.alert_rewards:
-                if reward.name == 'VBucks':
-                    vbuck_missions.append(mission)
-                    vbuck_count += reward.quantity
-                    break
+        vbuck_missions = snapshot.by_category.get('vbucks', ())
+        vbuck_count = snapshot.totals.get('vbucks', 0)
 
         fields = self.missions_to_fields(vbuck_missions, include_theater=True)
         embeds = self.bot.fields_to_embeds(
@@ -143,15 +162,12 @@ class MissionCommands(app_commands.Group):
     async def survivors(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        missions = await self.bot.missions()
-
-        leg_surv_missions = []
+        snapshot = await self.bot.missions()
 
-        for mission in missions:
-            for reward in mission.alert_rewards:
-                if (reward.name == 'Survivor' and reward.rarity == 'legendary') or reward.rarity == 'mythic':
-                    leg_surv_missions.append(mission)
-                    break
+        leg_surv_missions = snapshot.union(
+            snapshot.by_reward.get(('survivor', 'legendary'), ()),
+            snapshot.by_rarity.get('mythic', ())
+        )
 
         fields = self.missions_to_fields(leg_surv_missions, include_theater=True)
         embeds = self.bot.fields_to_embeds(
@@ -172,15 +188,9 @@ class MissionCommands(app_commands.Group):
     async def schematics(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        missions = await self.bot.missions()
-
-        schematic_missions = []
+        snapshot = await self.bot.missions()
 
-        for mission in missions:
-            for reward in mission.alert_rewards:
-                if 'Schematic' in reward.template_id and reward.rarity == 'legendary':
-                    schematic_missions.append(mission)
-                    break
+        schematic_missions = snapshot.by_reward.get(('schematic', 'legendary'), ())
 
         fields = self.missions_to_fields(schematic_missions, include_theater=True)
         embeds = self.bot.fields_to_embeds(
@@ -201,15 +211,9 @@ class MissionCommands(app_commands.Group):
     async def heroes(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        missions = await self.bot.missions()
+        snapshot = await self.bot.missions()
 
-        hero_missions = []
-
-        for mission in missions:
-            for reward in mission.alert_rewards:
-                if 'Hero' in reward.template_id and reward.rarity == 'legendary':
-                    hero_missions.append(mission)
-                    break
+        hero_missions = snapshot.by_reward.get(('hero', 'legendary'), ())
 
         fields = self.missions_to_fields(hero_missions, include_theater=True)
         embeds = self.bot.fields_to_embeds(
@@ -223,6 +227,75 @@ class MissionCommands(app_commands.Group):
 
         await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
 
+    async def _index_autocomplete(self, index_name: str, current: str) -> list[app_commands.Choice[str]]:
+        world = self.bot.world_model
+        if world is None:
+            return []
+        return [
+            app_commands.Choice(name=key, value=key) for key in sorted(getattr(world, index_name))
+            if current.lower() in key.lower()
+        ][:25]
+
+    async def zone_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+        return await self._index_autocomplete('by_tile_theme', current)
+
+    async def modifier_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+        return await self._index_autocomplete('by_modifier', current)
+
+    @non_premium_cooldown()
+    @is_logged_in()
+    @is_not_blacklisted()
+    @app_commands.describe(
+        mission='Type of mission.',
+        theater='Zone the mission is in.',
+        zone_theme='Zone theme of the mission tile (e.g. Suburban).',
+        modifier='Mission alert modifier.',
+        min_power='Minimum power rating.',
+        max_power='Maximum power rating.')
+    @app_commands.choices(
+        mission=[app_commands.Choice(name=name, value=name) for name in sorted(set(stringList['Missions'].values()))],
+        theater=[app_commands.Choice(name=theater, value=theater) for theater in [
+            'Stonewood', 'Plankerton', 'Canny Valley', 'Twine Peaks'
+        ]])
+    @app_commands.autocomplete(zone_theme=zone_autocomplete, modifier=modifier_autocomplete)
+    @app_commands.command(name='search', description='Search every mission available today, with or without alerts.')
+    async def search(
+            self,
+            interaction: Interaction,
+            mission: app_commands.Choice[str] = None,
+            theater: app_commands.Choice[str] = None,
+            zone_theme: str = None,
+            modifier: str = None,
+            min_power: int = None,
+            max_power: int = None
+    ):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        world = await self.bot.world()
+        results = world.search(
+            name=mission.value if mission else None,
+            theater=theater.value if theater else None,
+            tile_theme=zone_theme,
+            modifier=modifier,
+            min_power=min_power,
+            max_power=max_power
+        )
+
+        if not results:
+            raise STWException('No missions match those filters.')
+
+        fields = self.world_missions_to_fields(results)
+        embeds = self.bot.fields_to_embeds(
+            interaction,
+            fields,
+            field_limit=4,
+            description=f'**Total Missions:** `{len(results)}`',
+            author_name='Mission Search',
+            author_icon=self.bot.user.avatar
+        )
+
+        await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
+
 
 async def setup(bot: STWBot):
     bot.tree.add_command(MissionCommands(bot))
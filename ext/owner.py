@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from discord import app_commands, Interaction
+
+from main import STWBot
+from components.embed import CustomEmbed
+from components.decorators import is_owner
+from resources.emojis import emojis
+
+
+# noinspection PyUnresolvedReferences
+class OwnerCommands(app_commands.Group):
+
+    def __init__(
+            self,
+            bot: STWBot,
+            name: str = 'owner'
+    ):
+        super().__init__(name=name)
+        self.bot = bot
+
+    @staticmethod
+    def _size(size: float) -> str:
+        for unit in ('B', 'KB', 'MB'):
+            if size < 1024:
+                return f'{size:.1f}{unit}'
+            size /= 1024
+        return f'{size:.1f}GB'
+
+    @staticmethod
+    def _timestamp(day: datetime) -> str:
+        if day is None:
+            return '`Never`'
+        return f'<t:{int(day.replace(tzinfo=timezone.utc).timestamp())}:D>'
+
+    @is_owner()
+    @app_commands.describe(
+        days='How many days back to search.',
+        theater='Only include alerts from this zone.',
+        category='Only include rewards of this category.',
+        rarity='Only include rewards of this rarity.',
+        item='Only include rewards with this exact name (e.g. Lead Survivor).')
+    @app_commands.choices(
+        theater=[app_commands.Choice(name=theater, value=theater) for theater in [
+            'Stonewood', 'Plankerton', 'Canny Valley', 'Twine Peaks'
+        ]],
+        category=[app_commands.Choice(name=category.capitalize(), value=category) for category in [
+            'vbucks', 'survivor', 'schematic', 'hero', 'other'
+        ]],
+        rarity=[app_commands.Choice(name=rarity.capitalize(), value=rarity) for rarity in [
+            'common', 'uncommon', 'rare', 'epic', 'legendary', 'mythic'
+        ]])
+    @app_commands.command(name='history', description='Search the archive of past mission alert rewards.')
+    async def history(
+            self,
+            interaction: Interaction,
+            days: int = 30,
+            theater: app_commands.Choice[str] = None,
+            category: app_commands.Choice[str] = None,
+            rarity: app_commands.Choice[str] = None,
+            item: str = None
+    ):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        filters = {
+            'theater': theater.value if theater else None,
+            'category': category.value if category else None,
+            'rarity': rarity.value if rarity else None,
+            'name': item
+        }
+
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=max(days, 1))
+
+        started_at = perf_counter()
+        summary = await self.bot.mongo_db.mission_history_summary(start, end, **filters)
+        elapsed = (perf_counter() - started_at) * 1000
+
+        filter_str = ', '.join(f'{key}=`{value}`' for key, value in filters.items() if value is not None) or '`None`'
+
+        embed = CustomEmbed(
+            interaction,
+            description=f'**Filters:** {filter_str}\n'
+                        f'**Period:** Last `{max(days, 1)}` day(s)'
+        )
+        embed.set_author(name='Mission Alert History', icon_url=self.bot.user.avatar)
+        embed.set_footer(text=f'Query took {elapsed:.1f}ms')
+
+        embed.add_field(
+            name='Summary:',
+            value=f'> {emojis["loot"]} **Matching Rewards:** `{summary["rewards"]:,}`\n'
+                  f'> {emojis["loot"]} **Total Quantity:** `{summary["quantity"]:,}`\n'
+                  f'> {emojis["clock"]} **Days Seen:** `{summary["days"]}`\n'
+                  f'> {emojis["clock"]} **First Seen:** {self._timestamp(summary["first_seen"])}\n'
+                  f'> {emojis["clock"]} **Last Seen:** {self._timestamp(summary["last_seen"])}',
+            inline=False
+        )
+
+        await interaction.followup.send(embed=embed)
+
+    @is_owner()
+    @app_commands.command(name='database', description='View MongoDB connection pool and write buffer metrics.')
+    async def database(self, interaction: Interaction):
+        pool = self.bot.mongo_db.pool_metrics.metrics
+        buffer = self.bot.mongo_db.write_buffer.metrics
+
+        failures = ', '.join(f'{reason}: `{count}`' for reason, count in pool['failures'].items()) or '`None`'
+
+        embed = CustomEmbed(interaction)
+        embed.set_author(name='Database Metrics', icon_url=self.bot.user.avatar)
+
+        embed.add_field(
+            name='Connection Pool:',
+            value=f'> {emojis["clock"]} **Average Wait:** `{pool["average_wait_ms"]:.2f}ms`\n'
+                  f'> {emojis["clock"]} **Longest Wait:** `{pool["max_wait_ms"]:.2f}ms`\n'
+                  f'> {emojis["loot"]} **Checkouts:** `{pool["checkouts"]:,}` (`{pool["waiting"]}` waiting)\n'
+                  f'> {emojis["loot"]} **Open Connections:** `{pool["open_connections"]}`\n'
+                  f'> {emojis["cross"]} **Failed Checkouts:** {failures}\n'
+                  f'> {emojis["cross"]} **Pool Clears:** `{pool["pool_clears"]}`',
+            inline=False
+        )
+        embed.add_field(
+            name='Write Buffer:',
+            value=f'> {emojis["loot"]} **Pending:** `{buffer["pending"]:,}`\n'
+                  f'> {emojis["loot"]} **Queued:** `{buffer["queued"]:,}` (`{buffer["coalesced"]:,}` coalesced)\n'
+                  f'> {emojis["check"]} **Written:** `{buffer["written"]:,}` in `{buffer["flushes"]:,}` flush(es)\n'
+                  f'> {emojis["cross"]} **Failed:** `{buffer["failed"]:,}` (`{buffer["requeued"]:,}` requeued)\n'
+                  f'> {emojis["cross"]} **Dropped:** `{buffer["dropped"]:,}`\n'
+                  f'> {emojis["clock"]} **Longest Flush:** `{buffer["max_flush_seconds"] * 1000:.1f}ms`',
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @is_owner()
+    @app_commands.command(name='memory', description='View the memory used by cached profiles, overall and per user.')
+    async def memory(self, interaction: Interaction):
+        cache = self.bot.epic_api.profile_cache
+        metrics = cache.metrics
+        budget = cache.max_cost
+
+        # The budget can be disabled (None), or set to 0 to turn the cache off
+        if budget:
+            limit = f'`{self._size(budget)}` (`{metrics["cost"] / budget:.1%}`)'
+        else:
+            limit = '`No Limit`' if budget is None else '`0B`'
+
+        embed = CustomEmbed(interaction)
+        embed.set_author(name='Profile Cache Memory', icon_url=self.bot.user.avatar)
+
+        embed.add_field(
+            name='Overall:',
+            value=f'> {emojis["loot"]} **Used:** `{self._size(metrics["cost"])}` of {limit}\n'
+                  f'> {emojis["loot"]} **Entries:** `{metrics["size"]:,}` (`{metrics["in_flight"]}` loading)\n'
+                  f'> {emojis["check"]} **Hit Rate:** `{metrics["hit_rate"]:.1%}` '
+                  f'(`{metrics["loads"]:,}` loads, `{metrics["load_failures"]:,}` failed)\n'
+                  f'> {emojis["cross"]} **Evicted:** `{metrics["evictions"]:,}` '
+                  f'(`{metrics["expirations"]:,}` expired)\n'
+                  f'> {emojis["clock"]} **Sessions:** `{self.bot.session_count:,}`',
+            inline=False
+        )
+
+        # Entries are partitioned by the Discord ID of the session that loaded them
+        usage = sorted(cache.usage().items(), key=lambda user: user[1]['cost'], reverse=True)
+        embed.add_field(
+            name='Top Users:',
+            value='\n'.join(
+                f'> <@{discord_id}> `{self._size(user["cost"])}` (`{user["size"]}` entries)'
+                for discord_id, user in usage[:10]
+            ) or '> `None`',
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: STWBot):
+    bot.tree.add_command(OwnerCommands(bot))
@@ -2,7 +2,7 @@ from discord import app_commands, Interaction
 
 from main import STWBot
 from core.fortnite import AccountResource
-from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
+from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown, prefetches_profile
 from components.embed import CustomEmbed
 from resources.emojis import emojis
 
@@ -37,6 +37,7 @@ class ProfileCommands(app_commands.Group):
         return '\n'.join([f'> {resource.emoji} **{resource.quantity:,}**'
                           for resource in resources if resource.name in name_list]) or '> `None`'
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -45,9 +46,7 @@ class ProfileCommands(app_commands.Group):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         auth = self.bot.get_auth_session(interaction.user.id)
-        account = await auth.get_other_account(display=display) if display is not None else await auth.get_own_account()
-        icon_url = await account.icon_url()
-        resources = await account.resources()
+        account, icon_url, resources = await auth.load_account(display, 'icon', 'resources')
 
         embed = CustomEmbed(
             interaction,
@@ -4,7 +4,7 @@ from main import STWBot
 from core.errors import STWException
 from core.fortnite import Schematic
 from components.embed import EmbedField
-from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
+from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown, prefetches_profile
 from components.paginator import Paginator
 from components.itemselect import RecycleSelectionMenu, UpgradeSelectionMenu
 from resources.emojis import emojis
@@ -46,6 +46,7 @@ class SchematicCommands(app_commands.Group):
 
         return embed_fields
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -55,8 +56,8 @@ class SchematicCommands(app_commands.Group):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         auth = self.bot.get_auth_session(interaction.user.id)
-        account = await auth.get_other_account(display=display) if display is not None else await auth.get_own_account()
-        schematics = [schematic for schematic in await account.schematics() if name.lower() in schematic.name.lower()]
+        account, schematics, icon_url = await auth.load_account(display, 'schematics', 'icon')
+        schematics = [schematic for schematic in schematics if name.lower() in schematic.name.lower()]
 
         if not schematics:
             raise STWException(f'Schematic `{name}` not found.')
@@ -67,11 +68,12 @@ class SchematicCommands(app_commands.Group):
             embed_fields,
             description=f'**IGN:** `{account.display}`',
             author_name='All Schematics',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -95,8 +97,9 @@ class SchematicCommands(app_commands.Group):
         if level not in range(2, 61):
             raise STWException(f'Level `{level}` is invalid, please try again.')
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        schematics = [schematic for schematic in await account.schematics() if name.lower() in schematic.name.lower()]
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, schematics, icon_url = await auth.load_account(None, 'schematics', 'icon')
+        schematics = [schematic for schematic in schematics if name.lower() in schematic.name.lower()]
 
         if not schematics:
             raise STWException(f'Schematic `{name}` not found.')
@@ -107,7 +110,7 @@ class SchematicCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Upgrade Schematics',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
@@ -122,6 +125,7 @@ class SchematicCommands(app_commands.Group):
 
         await interaction.followup.send(embed=embeds[0], view=view)
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -130,8 +134,9 @@ class SchematicCommands(app_commands.Group):
     async def recycle(self, interaction: Interaction, name: str = ''):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        schematics = [schematic for schematic in await account.schematics() if name.lower() in schematic.name.lower()]
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, schematics, icon_url = await auth.load_account(None, 'schematics', 'icon')
+        schematics = [schematic for schematic in schematics if name.lower() in schematic.name.lower()]
 
         if not schematics:
             raise STWException(f'Schematic `{name}` not found.')
@@ -142,7 +147,7 @@ class SchematicCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Recycle Schematics',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
@@ -0,0 +1,127 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from discord import app_commands, Interaction
+
+from main import STWBot
+from core.errors import STWException
+from core.missions import describe_subscription
+from components.embed import EmbedField
+from components.decorators import is_not_blacklisted, non_premium_cooldown
+from components.paginator import Paginator
+from resources.emojis import emojis
+
+
+# noinspection PyUnresolvedReferences
+class SubscriptionCommands(app_commands.Group):
+
+    def __init__(
+            self,
+            bot: STWBot,
+            name: str = 'subscriptions'
+    ):
+        super().__init__(name=name)
+        self.bot = bot
+
+        self.max_subscriptions = {True: 25, False: 10}
+
+    @non_premium_cooldown()
+    @is_not_blacklisted()
+    @app_commands.describe(
+        category='Reward category to look out for.',
+        rarity='Reward rarity to look out for.',
+        item='Exact reward name to look out for (e.g. Lead Survivor).',
+        min_quantity='Only notify for rewards of at least this quantity.',
+        min_power='Only notify for missions of at least this power rating.',
+        post_here='Post notifications in this channel instead of your DMs.')
+    @app_commands.choices(
+        category=[app_commands.Choice(name=category.capitalize(), value=category) for category in [
+            'vbucks', 'survivor', 'schematic', 'hero', 'other'
+        ]],
+        rarity=[app_commands.Choice(name=rarity.capitalize(), value=rarity) for rarity in [
+            'common', 'uncommon', 'rare', 'epic', 'legendary', 'mythic'
+        ]])
+    @app_commands.command(name='add', description='Get notified when a mission alert matches your criteria.')
+    async def add(
+            self,
+            interaction: Interaction,
+            category: app_commands.Choice[str] = None,
+            rarity: app_commands.Choice[str] = None,
+            item: str = None,
+            min_quantity: int = 0,
+            min_power: int = 0,
+            post_here: bool = False
+    ):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        if post_here is True and (interaction.guild is None or interaction.permissions.manage_channels is not True):
+            raise STWException('You need the `Manage Channels` permission to post notifications in a channel.')
+
+        premium = await self.bot.user_is_premium(interaction.user.id)
+        if len(await self.bot.mongo_db.get_subscriptions(interaction.user.id)) >= self.max_subscriptions[premium]:
+            raise STWException(f'You can only have up to `{self.max_subscriptions[premium]}` subscriptions.')
+
+        subscription = await self.bot.mongo_db.add_subscription(
+            interaction.user.id,
+            channel_id=interaction.channel_id if post_here is True else None,
+            name=item,
+            category=category.value if category else None,
+            rarity=rarity.value if rarity else None,
+            min_quantity=max(min_quantity, 0),
+            min_power=max(min_power, 0)
+        )
+
+        await self.bot.basic_response(
+            interaction,
+            f'Subscribed to `{describe_subscription(subscription)}` (ID: `{subscription["_id"]}`).'
+        )
+
+    @non_premium_cooldown()
+    @is_not_blacklisted()
+    @app_commands.command(name='list', description='View your mission alert subscriptions.')
+    async def list(self, interaction: Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        subscriptions = await self.bot.mongo_db.get_subscriptions(interaction.user.id)
+
+        if not subscriptions:
+            raise STWException('You have no mission alert subscriptions. Use `/subscriptions add` to create one.')
+
+        fields = [
+            EmbedField(
+                name=describe_subscription(subscription),
+                value=f'> {emojis["id"]} **ID:** `{subscription["_id"]}`\n'
+                      f'> **Sent To:** '
+                      f'{"<#" + str(subscription["channel_id"]) + ">" if subscription.get("channel_id") else "`DMs`"}'
+            )
+            for subscription in subscriptions
+        ]
+        embeds = self.bot.fields_to_embeds(
+            interaction,
+            fields,
+            description=interaction.user.mention,
+            author_name='Mission Alert Subscriptions',
+            author_icon=self.bot.user.avatar
+        )
+
+        await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
+
+    @non_premium_cooldown()
+    @is_not_blacklisted()
+    @app_commands.describe(subscription_id='ID of the subscription, as shown by `/subscriptions list`.')
+    @app_commands.command(name='remove', description='Remove one of your mission alert subscriptions.')
+    async def remove(self, interaction: Interaction, subscription_id: str):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        try:
+            subscription = await self.bot.mongo_db.delete_subscription(interaction.user.id, ObjectId(subscription_id))
+        except InvalidId:
+            subscription = None
+
+        if subscription is None:
+            raise STWException(f'Subscription `{subscription_id}` not found.')
+
+        await self.bot.basic_response(interaction, f'Unsubscribed from `{describe_subscription(subscription)}`.')
+
+
+async def setup(bot: STWBot):
+    bot.tree.add_command(SubscriptionCommands(bot))
@@ -6,7 +6,7 @@ from main import STWBot
 from core.errors import STWException
 from core.fortnite import Survivor, LeadSurvivor
 from components.embed import EmbedField, CustomEmbed
-from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown
+from components.decorators import is_not_blacklisted, is_logged_in, non_premium_cooldown, prefetches_profile
 from components.itemselect import RecycleSelectionMenu, UpgradeSelectionMenu
 from components.paginator import Paginator
 from resources.emojis import emojis
@@ -23,6 +23,7 @@ class SurvivorCommands(app_commands.Group):
         super().__init__(name=name)
         self.bot = bot
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -31,9 +32,7 @@ class SurvivorCommands(app_commands.Group):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         auth = self.bot.get_auth_session(interaction.user.id)
-        account = await auth.get_other_account(display=display) if display is not None else await auth.get_own_account()
-        icon_url = await account.icon_url()
-        squads = await account.survivor_squads()
+        account, icon_url, squads = await auth.load_account(display, 'icon', 'squads')
 
         embed_list = []
 
@@ -95,6 +94,7 @@ class SurvivorCommands(app_commands.Group):
 
         return embed_fields
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -107,8 +107,7 @@ class SurvivorCommands(app_commands.Group):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         auth = self.bot.get_auth_session(interaction.user.id)
-        account = await auth.get_other_account(display=display) if display is not None else await auth.get_own_account()
-        survivors = await account.survivors()
+        account, survivors, icon_url = await auth.load_account(display, 'survivors', 'icon')
 
         if personality is not None:
             survivors = [survivor for survivor in survivors if survivor.personality == personality.value]
@@ -122,11 +121,12 @@ class SurvivorCommands(app_commands.Group):
             embed_fields,
             description=f'**IGN:** `{account.display}`',
             author_name='All Survivors',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         await interaction.followup.send(embed=embeds[0], view=Paginator(interaction, embeds))
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -148,8 +148,8 @@ class SurvivorCommands(app_commands.Group):
         if level not in range(2, 61):
             raise STWException(f'Level `{level}` is invalid, please try again.')
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        survivors = await account.survivors()
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, survivors, icon_url = await auth.load_account(None, 'survivors', 'icon')
 
         if personality is not None:
             survivors = [survivor for survivor in survivors if survivor.personality == personality.value]
@@ -163,7 +163,7 @@ class SurvivorCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Upgrade Survivors',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
@@ -177,6 +177,7 @@ class SurvivorCommands(app_commands.Group):
 
         await interaction.followup.send(embed=embeds[0], view=view)
 
+    @prefetches_profile()
     @non_premium_cooldown()
     @is_logged_in()
     @is_not_blacklisted()
@@ -188,8 +189,8 @@ class SurvivorCommands(app_commands.Group):
     async def recycle(self, interaction: Interaction, personality: app_commands.Choice[str] = None):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        account = await self.bot.get_full_account(interaction.user.id)
-        survivors = await account.survivors()
+        auth = self.bot.get_auth_session(interaction.user.id)
+        account, survivors, icon_url = await auth.load_account(None, 'survivors', 'icon')
 
         if personality is not None:
             survivors = [survivor for survivor in survivors if survivor.personality == personality.value]
@@ -203,7 +204,7 @@ class SurvivorCommands(app_commands.Group):
             embed_fields,
             description=interaction.user.mention,
             author_name='Recycle Survivors',
-            author_icon=await account.icon_url()
+            author_icon=icon_url
         )
 
         view = Paginator(interaction, embeds)
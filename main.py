@@ -1,7 +1,7 @@
 import logging
 import asyncio
 import os
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientError
 from typing import Union, Dict, Optional
 from math import floor
 from datetime import timedelta
@@ -15,6 +15,7 @@ try:
     from discord.ext import commands, tasks
     from discord.utils import MISSING
     from discord.ui import View
+    from pymongo.errors import PyMongoError
     from discord import (
         __version__ as __discord__,
         Intents,
@@ -24,18 +25,20 @@ try:
         PrivilegedIntentsRequired,
         InteractionResponded,
         Guild,
-        Color
+        Color,
+        Embed,
+        DiscordException
     )
 
     # local imports
-    from core.api import EpicGamesClient, AuthSession
-    from core.errors import Unauthorized, HTTPException
+    from core.api import EpicGamesClient, FortniteCentralClient, AuthSession
+    from core.errors import STWException, Unauthorized, HTTPException
     from core.mongo import MongoDBClient
     from core.accounts import FullEpicAccount, FriendEpicAccount, PartialEpicAccount
     from core.fortnite import MissionAlert
+    from core.missions import MissionAlertSnapshot, WorldModel, SubscriptionMatcher, describe_subscription, utc_day
     from components.embed import CustomEmbed, EmbedField
     from components.traceback import TracebackView
-    from resources.lookup import stringList
     from resources import config
 except ModuleNotFoundError as unknown_import:
     logging.fatal(f'Missing required dependencies - {unknown_import}.')
@@ -56,17 +59,29 @@ class STWBot(commands.Bot):
             owner_ids=config.OWNERS
         )
         # Redefined later on
-        self._session = self.epic_api = self.mongo_db = None
+        self._session = self.epic_api = self.fnc_api = self.mongo_db = None
 
         self.app_commands = []
         self.tree.on_error = self.app_command_error
 
         self._cached_auth_sessions: Dict[int, AuthSession] = {}
 
-        self._mission_alert_cache = []
-        self._fnc_base_url = 'https://fortnitecentral.genxgames.gg/api/v1/export?path='
+        # Background profile loads for users who opted in, so each user only has one running at a time
+        self._prefetch_tasks: Dict[int, asyncio.Task] = {}
+
+        # Deliberately not an `AsyncCache`: these go stale at the UTC day boundary rather than after a TTL, and a stale
+        # snapshot is still served (and kept, along with the matching world model) until its refresh has succeeded,
+        # whereas an expired cache entry is gone. `_start_mission_refresh` already makes the refresh single-flight.
+        self._mission_alert_snapshot: Optional[MissionAlertSnapshot] = None
+        self._world_model: Optional[WorldModel] = None
+        self._mission_refresh_task: Optional[asyncio.Task] = None
         self._all_theaters = '/Game/Balance/DataTables/GameDifficultyGrowthBounds.GameDifficultyGrowthBounds'
 
+        # Mission alert notifications are queued and sent one at a time, spaced out by this many seconds
+        self._notification_queue: asyncio.Queue = asyncio.Queue()
+        self._notification_interval = 1
+        self._notification_sender: Optional[asyncio.Task] = None
+
     @staticmethod
     def color(guild: Guild) -> Union[Color, int]:
         try:
@@ -108,6 +123,10 @@ class STWBot(commands.Bot):
     def get_auth_session(self, discord_id: int) -> Optional[AuthSession]:
         return self._cached_auth_sessions.get(discord_id)
 
+    @property
+    def session_count(self) -> int:
+        return len(self._cached_auth_sessions)
+
     def discord_id_from_partial(self, account: Union[PartialEpicAccount, FriendEpicAccount]) -> Optional[int]:
         for discord_id in self._cached_auth_sessions:
             if self._cached_auth_sessions[discord_id].epic_id == account.id:
@@ -131,6 +150,7 @@ class STWBot(commands.Bot):
             pass
 
         self._cached_auth_sessions.pop(discord_id)
+        self.epic_api.profile_cache.invalidate_partition(discord_id)
 
     def user_is_logged_in(self, discord_id: int) -> bool:
         return True if isinstance(self.get_auth_session(discord_id), AuthSession) else False
@@ -144,6 +164,40 @@ class STWBot(commands.Bot):
     async def user_setting_stay_signed_in(self, discord_id: int) -> bool:
         return (await self.mongo_db.search_settings_entry(discord_id)).get('stay_signed_in', True)
 
+    async def user_setting_prefetch_profile(self, discord_id: int) -> bool:
+        return (await self.mongo_db.search_settings_entry(discord_id)).get('prefetch_profile', False)
+
+    async def prefetch_profile(self, discord_id: int) -> Optional[asyncio.Task]:
+        """
+        Starts loading a user's own account, profile, typed items and icon in the background, if they opted in.
+
+        Commands that need the same data wait for the prefetch instead of requesting it again.
+        """
+        auth_session = self.get_auth_session(discord_id)
+        if auth_session is None or await self.user_setting_prefetch_profile(discord_id) is not True:
+            return None
+
+        task = self._prefetch_tasks.get(discord_id)
+        if task is None or task.done():
+            task = self._prefetch_tasks[discord_id] = asyncio.create_task(self._prefetch_profile(auth_session))
+            task.add_done_callback(lambda _: self._prefetch_tasks.pop(discord_id, None))
+        return task
+
+    @staticmethod
+    async def _prefetch_profile(auth_session: AuthSession) -> None:
+        try:
+            await auth_session.load_account(None, 'icon', 'schematics', 'survivors', 'heroes', 'resources')
+        except HTTPException as error:
+            # The command that actually needs the data will retry and report the error itself
+            logging.info(f'Could not prefetch the profile of {auth_session.epic_id}: {error}')
+
+    async def on_app_command_completion(
+            self,
+            interaction: Interaction,
+            command: Union[app_commands.Command, app_commands.ContextMenu]
+    ) -> None:
+        self.mongo_db.record_command_use(interaction.user.id, command.qualified_name)
+
     async def app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError) -> None:
         if isinstance(error, app_commands.CommandOnCooldown):
             message = f'You\'re on cooldown. Try again in `{timedelta(seconds=floor(error.retry_after))}`.'
@@ -162,11 +216,23 @@ class STWBot(commands.Bot):
 
     @tasks.loop(minutes=1)
     async def manage_sessions(self) -> None:
-        for discord_id in self._cached_auth_sessions:
+        try:
+            await self.epic_api.renew_client_sessions()
+        except HTTPException as error:
+            logging.error(f'Failed to renew client credentials session: {error}')
+
+        # Settings for every session about to expire are fetched together, rather than one query per session
+        expiring = [discord_id for discord_id, auth in self._cached_auth_sessions.items()
+                    if auth.refresh_expires_at - t_time() < 120]
+        settings = await self.mongo_db.bulk_settings(expiring) if expiring else {}
+
+        for discord_id in list(self._cached_auth_sessions):
 
             auth = self.get_auth_session(discord_id)
+            if auth is None:
+                continue
 
-            if auth.refresh_expires_at - t_time() < 120 and await self.user_setting_stay_signed_in(discord_id) is True:
+            if discord_id in settings and settings[discord_id].get('stay_signed_in', True) is True:
                 logging.info(f'Attempting to renew Auth session {auth.access_token}...')
                 try:
                     await auth.renew()
@@ -175,22 +241,99 @@ class STWBot(commands.Bot):
                     logging.error(f'Failed to renew Auth session {auth.access_token} - ending session...')
                     await self.del_auth_session(discord_id)
 
-            elif auth.cache_is_expired is True:
-                auth.del_own_account()
+            else:
+                auth.expire_cache()
+
+        # Frees expired profiles of users who have not run a command since, rather than waiting for them to be evicted
+        self.epic_api.profile_cache.expire()
+
+    async def missions(self) -> MissionAlertSnapshot:
+        if self._mission_alert_snapshot is None:
+            await self.refresh_missions()
+
+        # Yesterday's alerts are still better than making the user wait on a full refresh
+        elif self._mission_alert_snapshot.is_current is False:
+            self._start_mission_refresh()
 
-    async def missions(self) -> list[MissionAlert]:
-        if not self._mission_alert_cache:
-            await self.refresh_mission_alerts()
-        return self._mission_alert_cache
+        if self._mission_alert_snapshot is None:
+            raise STWException('Today\'s mission alerts are unavailable right now, please try again later.')
+        return self._mission_alert_snapshot
+
+    @property
+    def world_model(self) -> Optional[WorldModel]:
+        return self._world_model
+
+    async def world(self) -> WorldModel:
+        # The world model is saved alongside today's alerts, so this is only missing before the first refresh of a day
+        # Commands never wait on Epic for it, they just ask the user to try again once it is ready
+        if self._world_model is None:
+            self._start_mission_refresh()
+            raise STWException('Mission data is still loading, please try again in a moment.')
+        return self._world_model
+
+    @property
+    def _mission_refresh_running(self) -> bool:
+        return self._mission_refresh_task is not None and not self._mission_refresh_task.done()
+
+    async def load_missions(self) -> None:
+        try:
+            data = await self.mongo_db.get_mission_snapshot(utc_day())
+        except PyMongoError as error:
+            logging.error(f'Unable to load today\'s mission alerts from MongoDB: {error}')
+            return
+
+        if data is not None:
+            self._mission_alert_snapshot = MissionAlertSnapshot.from_dict(data)
+            logging.info(f'Loaded {len(self._mission_alert_snapshot)} mission alerts for {data["day"]}.')
+
+            # Snapshots saved before the world model was stored with them only have alerts
+            if data.get('world') is not None:
+                self._world_model = WorldModel.from_dict(data['world'])
+                logging.info(f'Loaded {len(self._world_model)} missions for {data["day"]}.')
+
+    def _start_mission_refresh(self) -> asyncio.Task:
+        # Concurrent callers share the refresh that is already running instead of starting their own
+        # The task is kept in `_mission_refresh_task`, so it cannot be garbage collected while running
+        if not self._mission_refresh_running:
+            self._mission_refresh_task = asyncio.create_task(self._refresh_missions())
+            self._mission_refresh_task.add_done_callback(self._log_mission_refresh_error)
+        return self._mission_refresh_task
+
+    @staticmethod
+    def _log_mission_refresh_error(task: asyncio.Task) -> None:
+        # Background refreshes have nobody awaiting them, so their errors would otherwise never be seen
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            logging.error(
+                f'Mission alert refresh failed: {"".join(format_exception(type(error), error, error.__traceback__))}'
+            )
+
+    async def refresh_missions(self) -> None:
+        await asyncio.shield(self._start_mission_refresh())
+
+    async def _tile_theme_name(self, tile_theme_path: str) -> str:
+        try:
+            tile_theme_json = await self.fnc_api.export(tile_theme_path)
+            return tile_theme_json['jsonOutput'][1]['Properties']['ZoneName']['sourceString']
+        # STWException covers HTTP errors and empty exports, and ClientError/TimeoutError a connection failing
+        except (KeyError, IndexError, TypeError, STWException, ClientError, asyncio.TimeoutError):
+            return 'Unknown'
+
+    @tasks.loop(hours=1)
+    async def sync_cosmetics(self) -> None:
+        # Only downloads the dataset when the local index is over a day old, so restarts do not re-download it
+        await self.epic_api.icons.sync_cosmetics()
 
     @tasks.loop(time=dt_time(minute=1))
     async def refresh_mission_alerts(self) -> None:
-        self._mission_alert_cache = []
+        await self.refresh_missions()
 
+    async def _refresh_missions(self) -> None:
         logging.info('Attempting to refresh mission alert data...')
 
-        for discord_id in self._cached_auth_sessions:
-            auth_session = self._cached_auth_sessions[discord_id]
+        # Prefer our own client credentials session so users' sessions are left alone
+        # Users' sessions are only borrowed if Epic will not give us the data that way
+        for auth_session in [self.epic_api.client_session(), *self._cached_auth_sessions.values()]:
             try:
                 data = await auth_session.get_mission_data()
                 break
@@ -200,89 +343,136 @@ class STWBot(commands.Bot):
             logging.error('Unable to retrieve today\'s mission data, cancelling...')
             return
 
-        theaters = data.get('theaters')
-        missions = data.get('missions')
-        alerts = data.get('missionAlerts')
+        try:
+            difficulty_rows = (await self.fnc_api.export(self._all_theaters))['jsonOutput'][0]['Rows']
+        # Missions are still built without difficulty rows if the export is empty, malformed or unreachable
+        except (KeyError, IndexError, TypeError, STWException, ClientError, asyncio.TimeoutError) as error:
+            logging.error(f'Could not load difficulty rows, continuing without them: {error!r}')
+            difficulty_rows = {}
+
+        # Most tiles share a handful of zone themes, so each distinct theme is only looked up once
+        # Lookups run concurrently and are served from the FortniteCentral cache after the first refresh
+        tile_theme_paths = list({
+            tile['zoneTheme'].split('.')[0]
+            for theater in data.get('theaters', []) for tile in theater.get('tiles', []) if tile.get('zoneTheme')
+        })
+        tile_theme_names = dict(zip(tile_theme_paths, await asyncio.gather(
+            *[self._tile_theme_name(path) for path in tile_theme_paths]
+        )))
+
+        # The new world model and snapshot are built off to the side and only swapped in once they are complete
+        world = WorldModel.from_world_info(data, difficulty_rows, tile_theme_names)
+        self._world_model, self._mission_alert_snapshot = world, MissionAlertSnapshot(world.alerts())
+
+        # Archiving only succeeds once per day, which also stops subscribers being notified twice
+        try:
+            snapshot_data = {**self._mission_alert_snapshot.to_dict(), 'world': world.to_dict()}
+            await self.mongo_db.save_mission_snapshot(snapshot_data)
+            first_of_day = await self.mongo_db.archive_mission_history(self._mission_alert_snapshot.history_rows())
+        except PyMongoError as error:
+            logging.error(f'Unable to save today\'s mission alerts to MongoDB: {error}')
+        else:
+            if first_of_day is True:
+                await self.notify_subscribers(self._mission_alert_snapshot)
 
-        theater_data = await self._session.get(self._fnc_base_url + self._all_theaters)
-        theater_json = await theater_data.json()
+        logging.info('Success!')
 
-        async def _add_mission(i: int, theater: dict):
+    async def notify_subscribers(self, snapshot: MissionAlertSnapshot) -> None:
+        try:
+            subscriptions = await self.mongo_db.all_subscriptions()
+        except PyMongoError as error:
+            logging.error(f'Unable to load mission alert subscriptions: {error}')
+            return
 
-            theater_id = theater.get('theaterId')
-            for _theater in theaters:
-                if _theater.get('uniqueId') == theater_id:
-                    theater_name = _theater.get('displayName').get('en')
-                    break
-            else:
-                theater_name = 'Unknown Theater'
+        matches = SubscriptionMatcher(subscriptions).match(snapshot)
+        for match in matches.values():
+            self._notification_queue.put_nowait((match['subscription'], match['alerts']))
 
-            for available_alert in theater.get("availableMissionAlerts"):
+        logging.info(f'Queued {len(matches)} mission alert notification(s).')
 
-                tile_index = available_alert.get('tileIndex')
-                alert_rewards = available_alert.get('missionAlertRewards', {}).get('items', [])
+    def _notification_embed(self, subscription: dict, alerts: list[MissionAlert], guild: Guild = None) -> Embed:
+        embed = Embed(
+            title='Mission Alert Subscription',
+            description=f'**Matching:** `{describe_subscription(subscription)}`\n'
+                        f'**Total Missions:** `{len(alerts)}`',
+            color=self.color(guild)
+        )
 
-                tile_theme_path = data['theaters'][i]['tiles'][tile_index]['zoneTheme']
-                tile_theme_file = await self._session.get(self._fnc_base_url + tile_theme_path.split('.')[0])
-                tile_theme_json = await tile_theme_file.json()
+        for alert in alerts[:10]:
+            rewards_str = '\n'.join(
+                [f'> {reward.emoji} `{reward.name} x{reward.quantity}`' for reward in alert.alert_rewards])
+            embed.add_field(
+                name=f'{alert.name} ({alert.theater})',
+                value=f'> **Power Rating:** `{alert.power}`\n'
+                      f'> **Zone Theme:** `{alert.tile_theme}`\n'
+                      f'{rewards_str}',
+                inline=False
+            )
 
-                try:
-                    tile_theme_name = tile_theme_json['jsonOutput'][1]['Properties']['ZoneName']['sourceString']
-                except KeyError:
-                    tile_theme_name = 'Unknown'
+        if len(alerts) > 10:
+            embed.set_footer(text=f'...and {len(alerts) - 10} more. Use /missions to see them all.')
 
-                for mission in missions[i].get('availableMissions'):
-                    if mission.get('tileIndex') == tile_index:
+        return embed
 
-                        __theater = mission.get('missionDifficultyInfo').get("rowName")
-                        generator = mission.get('missionGenerator')
+    async def _send_notifications(self) -> None:
+        # Notifications are sent one at a time so a busy day never bursts into Discord's rate limits
+        while True:
+            subscription, alerts = await self._notification_queue.get()
 
-                        for mission_name in stringList['Missions']:
-                            if mission_name in generator:
-                                name = stringList['Missions'][mission_name]
-                                break
-                        else:
-                            name = 'Unknown Mission'
+            try:
+                if subscription.get('channel_id') is not None:
+                    target = self.get_channel(subscription['channel_id']) or \
+                        await self.fetch_channel(subscription['channel_id'])
+                else:
+                    target = self.get_user(subscription['discord_id']) or \
+                        await self.fetch_user(subscription['discord_id'])
 
-                        try:
-                            power = \
-                                theater_json['jsonOutput'][0]['Rows'][__theater]['ThreatDisplayName']['sourceString']
-                        except KeyError:
-                            power = '0'
+                await target.send(embed=self._notification_embed(subscription, alerts, getattr(target, 'guild', None)))
 
-                        self._mission_alert_cache.append(MissionAlert(
-                            name=name,
-                            power=power,
-                            theater=theater_name,
-                            tile_theme=tile_theme_name,
-                            alert_rewards_data=alert_rewards
-                        ))
+            except DiscordException as error:
+                logging.error(f'Failed to send mission alert notification {subscription.get("_id")}: {error}')
 
-                        break
+            # This is the only sender, so nothing may stop it or every later notification would wait forever
+            except Exception as error:
+                logging.error(
+                    f'Unexpected error sending mission alert notification {subscription.get("_id")}: '
+                    f'{"".join(format_exception(type(error), error, error.__traceback__))}'
+                )
 
-        add_mission_tasks = [asyncio.ensure_future(_add_mission(i, theater)) for i, theater in enumerate(alerts)]
-        await asyncio.gather(*add_mission_tasks)
+            finally:
+                self._notification_queue.task_done()
 
-        logging.info('Success!')
+            await asyncio.sleep(self._notification_interval)
 
     async def setup_hook(self) -> None:
         logging.info(f'Logging in as {self.user} (ID: {self.user.id})...')
         logging.info(f'Owner(s): {", ".join([(await self.fetch_user(user_id)).name for user_id in self.owner_ids])}')
 
         self._session = ClientSession()
-        self.epic_api = EpicGamesClient(self._session)
+        self.epic_api = EpicGamesClient(self._session, **config.EPIC_OPTIONS)
+        self.fnc_api = FortniteCentralClient(self._session)
 
         logging.info('Syncing app commands...')
         self.app_commands = await self.tree.sync()
         logging.info('Done!')
 
+        self._notification_sender = asyncio.create_task(self._send_notifications())
+
+        # Serve today's alerts and world model straight away if they were saved before a restart
+        # Epic is only asked again if nothing was saved today, otherwise `refresh_mission_alerts` runs after rollover
+        await self.load_missions()
+        snapshot = self._mission_alert_snapshot
+        if self._world_model is None or snapshot is None or snapshot.is_current is False:
+            self._start_mission_refresh()
+
         self.manage_sessions.start()
         self.refresh_mission_alerts.start()
+        self.sync_cosmetics.start()
 
     def run_bot(self) -> None:
 
         async def _run_bot():
-            async with self, MongoDBClient(config.MONGO) as self.mongo_db:
+            async with self, MongoDBClient(config.MONGO, **config.MONGO_OPTIONS) as self.mongo_db:
                 for filename in os.listdir('./ext'):
                     if filename.endswith('.py'):
                         try:
@@ -299,6 +489,10 @@ class STWBot(commands.Bot):
         async def _cleanup():
             self.manage_sessions.cancel()
             self.refresh_mission_alerts.cancel()
+            self.sync_cosmetics.cancel()
+
+            if self._notification_sender is not None:
+                self._notification_sender.cancel()
 
             kill_session_tasks = []
 
@@ -307,6 +501,14 @@ class STWBot(commands.Bot):
 
             await asyncio.gather(*kill_session_tasks)
 
+            # Normally already flushed when the database connection closed, unless the bot was interrupted first
+            if self.mongo_db is not None:
+                await self.mongo_db.write_buffer.close()
+                logging.info(f'Buffered MongoDB writes: {self.mongo_db.write_buffer.metrics}')
+
+            if self.epic_api is not None:
+                self.epic_api.icons.index.close()
+
             if self._session:
                 await self._session.close()
 
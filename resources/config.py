@@ -1,3 +1,5 @@
 TOKEN = ''
 OWNERS = {}
 MONGO = ''
+MONGO_OPTIONS = {}
+EPIC_OPTIONS = {}
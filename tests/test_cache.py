@@ -0,0 +1,191 @@
+import asyncio
+import unittest
+
+from core.cache import AsyncCache, LRUCache, PartitionedCache, TTLCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LoadTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_loads_share_one_loader(self):
+        cache = AsyncCache()
+        release = asyncio.Event()
+        calls = []
+
+        async def loader():
+            calls.append(None)
+            await release.wait()
+            return 'value'
+
+        lookups = [asyncio.create_task(cache.get_or_load('key', loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        self.assertTrue(cache.loading('key'))
+
+        release.set()
+        self.assertEqual(await asyncio.gather(*lookups), ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertFalse(cache.loading('key'))
+
+    async def test_invalidate_during_load_does_not_repopulate(self):
+        cache = AsyncCache()
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return 'stale'
+
+        lookup = asyncio.create_task(cache.get_or_load('key', loader))
+        await asyncio.sleep(0)
+        cache.invalidate('key')
+
+        release.set()
+        # The caller still gets the value it waited for, but it is not cached
+        self.assertEqual(await lookup, 'stale')
+        self.assertNotIn('key', cache)
+        self.assertFalse(cache.loading('key'))
+
+    async def test_cancelled_caller_does_not_cancel_the_load(self):
+        cache = AsyncCache()
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return 'value'
+
+        first = asyncio.create_task(cache.get_or_load('key', loader))
+        second = asyncio.create_task(cache.get_or_load('key', loader))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        release.set()
+        self.assertEqual(await second, 'value')
+        self.assertEqual(cache.get('key'), 'value')
+
+    async def test_failed_load_is_not_cached(self):
+        cache = AsyncCache()
+
+        async def loader():
+            raise RuntimeError('unreachable')
+
+        with self.assertRaises(RuntimeError):
+            await cache.get_or_load('key', loader)
+
+        self.assertNotIn('key', cache)
+        self.assertEqual(cache.metrics['load_failures'], 1)
+
+
+class EvictionTests(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted_first(self):
+        evicted = []
+        cache = LRUCache(max_size=2, on_evict=lambda key, value, reason: evicted.append((key, reason)))
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        # Reading 'a' makes 'b' the least recently used
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual(list(cache), ['a', 'c'])
+        self.assertEqual(evicted, [('b', 'size')])
+
+    def test_peek_does_not_affect_order(self):
+        cache = LRUCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        cache.peek('a')
+        cache.put('c', 3)
+
+        self.assertEqual(list(cache), ['b', 'c'])
+
+    def test_eviction_by_cost(self):
+        cache = AsyncCache(max_cost=10, cost=len)
+        cache.put('a', 'x' * 4)
+        cache.put('b', 'x' * 4)
+        cache.get('a')
+
+        cache.put('c', 'x' * 5)
+
+        self.assertEqual(list(cache), ['a', 'c'])
+        self.assertEqual(cache.total_cost, 9)
+        self.assertEqual(cache.metrics['evictions'], 1)
+
+    def test_update_cost_enforces_limit(self):
+        cache = AsyncCache(max_cost=10)
+        cache.put('a', None, cost=4)
+        cache.put('b', None, cost=4)
+
+        cache.update_cost('b', 8)
+
+        self.assertEqual(list(cache), ['b'])
+        self.assertEqual(cache.total_cost, 8)
+
+
+class ExpiryTests(unittest.TestCase):
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        evicted = []
+        cache = TTLCache(ttl=60, clock=clock, on_evict=lambda key, value, reason: evicted.append((key, reason)))
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=None)
+
+        clock.now = 59
+        self.assertEqual(cache.get('a'), 1)
+
+        clock.now = 60
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(evicted, [('a', 'expired')])
+
+    def test_expire_removes_without_lookups(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, clock=clock)
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=20)
+
+        clock.now = 15
+        self.assertEqual(cache.expire(), 1)
+        self.assertEqual(list(cache), ['b'])
+        self.assertEqual(cache.metrics['expirations'], 1)
+
+
+class PartitionTests(unittest.TestCase):
+
+    def test_usage_is_tracked_per_partition(self):
+        cache = PartitionedCache(max_cost=10)
+        cache.put((1, 'profile'), None, cost=3)
+        cache.put((1, 'friends'), None, cost=2)
+        cache.put((2, 'profile'), None, cost=4)
+
+        self.assertEqual(cache.usage(), {1: {'size': 2, 'cost': 5}, 2: {'size': 1, 'cost': 4}})
+
+        # Evicting (1, 'profile') to fit the new entry is reflected in the partition's usage
+        cache.put((2, 'friends'), None, cost=3)
+        self.assertEqual(cache.partition_usage(1), {'size': 1, 'cost': 2})
+        self.assertEqual(cache.partition_usage(2), {'size': 2, 'cost': 7})
+
+    def test_invalidate_partition(self):
+        cache = PartitionedCache()
+        cache.put((1, 'profile'), 'a')
+        cache.put((1, 'friends'), 'b')
+        cache.put((2, 'profile'), 'c')
+
+        cache.invalidate_partition(1)
+
+        self.assertEqual(list(cache), [(2, 'profile')])
+        self.assertEqual(cache.partition_usage(1), {'size': 0, 'cost': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
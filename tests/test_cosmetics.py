@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from core.cosmetics import CosmeticsIndex
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'cosmetics.json')
+
+
+class CosmeticsIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = CosmeticsIndex(os.path.join(self.directory.name, 'cosmetics.sqlite3'))
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_import_fixture(self):
+        self.assertTrue(self.index.needs_sync())
+        self.assertEqual(self.index.import_file(FIXTURE), 4)
+
+        self.assertEqual(len(self.index), 4)
+        self.assertFalse(self.index.needs_sync())
+        self.assertEqual(self.index.get('CID_028_Athena_Commando_F')['name'], 'Renegade Raider')
+
+    def test_icon_lookups(self):
+        self.index.import_file(FIXTURE)
+
+        # Lookups are case-insensitive, and fall back to the small icon
+        self.assertTrue(self.index.icon('cid_029_athena_commando_f_halloween').endswith('cid_029/icon.png'))
+        self.assertTrue(self.index.icon('CID_001_Athena_Commando_F_Default').endswith('smallicon.png'))
+        self.assertIsNone(self.index.icon('Pickaxe_Lockjaw'))
+        self.assertIsNone(self.index.icon('CID_Unknown'))
+        self.assertIsNone(self.index.icon(None))
+
+    def test_empty_dataset_keeps_previous_data(self):
+        self.index.import_file(FIXTURE)
+        synced_at = self.index.synced_at
+
+        for data in ({'status': 200, 'data': []}, []):
+            with self.assertRaises(ValueError):
+                self.index.import_dataset(data)
+
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.synced_at, synced_at)
+
+    def test_truncated_dataset_keeps_previous_data(self):
+        self.index.import_file(FIXTURE)
+
+        with self.assertRaises(ValueError):
+            self.index.import_dataset([{'id': 'CID_028_Athena_Commando_F', 'name': 'Renegade Raider'}])
+
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.get('CID_029_Athena_Commando_F_Halloween')['name'], 'Ghoul Trooper')
+
+    def test_smaller_dataset_within_limit_replaces_index(self):
+        self.index.import_file(FIXTURE)
+
+        self.assertEqual(self.index.import_dataset([{'id': 'A'}, {'id': 'B'}, {'id': 'C'}]), 3)
+        self.assertEqual(len(self.index), 3)
+        self.assertIsNone(self.index.get('CID_028_Athena_Commando_F'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+
+from pymongo.errors import AutoReconnect
+
+from core.mongo import WriteBehindBuffer, MongoDBClient
+
+
+class FakeCollection:
+
+    def __init__(self, name: str = 'test', error: Exception = None):
+        self.name = name
+        self.error = error
+        self.calls = []
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        self.calls.append(operations)
+        if self.error is not None:
+            raise self.error
+
+
+class MergeTests(unittest.TestCase):
+
+    merge = staticmethod(WriteBehindBuffer._merge)
+
+    def test_set_then_set(self):
+        self.assertEqual(self.merge({'$set': {'a': 1}}, {'$set': {'a': 2}}), {'$set': {'a': 2}})
+
+    def test_set_then_unset(self):
+        self.assertEqual(self.merge({'$set': {'a': 1}}, {'$unset': {'a': ''}}), {'$unset': {'a': ''}})
+
+    def test_set_then_inc(self):
+        self.assertEqual(self.merge({'$set': {'a': 1}}, {'$inc': {'a': 2}}), {'$set': {'a': 3}})
+
+    def test_set_then_set_on_insert(self):
+        self.assertEqual(self.merge({'$set': {'a': 1}}, {'$setOnInsert': {'a': 2}}), {'$set': {'a': 1}})
+
+    def test_unset_then_set(self):
+        self.assertEqual(self.merge({'$unset': {'a': ''}}, {'$set': {'a': 2}}), {'$set': {'a': 2}})
+
+    def test_unset_then_unset(self):
+        self.assertEqual(self.merge({'$unset': {'a': ''}}, {'$unset': {'a': ''}}), {'$unset': {'a': ''}})
+
+    def test_unset_then_inc(self):
+        self.assertEqual(self.merge({'$unset': {'a': ''}}, {'$inc': {'a': 2}}), {'$set': {'a': 2}})
+
+    def test_unset_then_set_on_insert(self):
+        self.assertEqual(self.merge({'$unset': {'a': ''}}, {'$setOnInsert': {'a': 2}}), {'$unset': {'a': ''}})
+
+    def test_inc_then_set(self):
+        self.assertEqual(self.merge({'$inc': {'a': 1}}, {'$set': {'a': 5}}), {'$set': {'a': 5}})
+
+    def test_inc_then_unset(self):
+        self.assertEqual(self.merge({'$inc': {'a': 1}}, {'$unset': {'a': ''}}), {'$unset': {'a': ''}})
+
+    def test_inc_then_inc(self):
+        self.assertEqual(self.merge({'$inc': {'a': 1}}, {'$inc': {'a': 2}}), {'$inc': {'a': 3}})
+
+    def test_inc_then_set_on_insert(self):
+        self.assertEqual(self.merge({'$inc': {'a': 1}}, {'$setOnInsert': {'a': 2}}), {'$inc': {'a': 1}})
+
+    def test_set_on_insert_then_set(self):
+        self.assertEqual(self.merge({'$setOnInsert': {'a': 1}}, {'$set': {'a': 2}}), {'$set': {'a': 2}})
+
+    def test_set_on_insert_then_unset(self):
+        self.assertEqual(self.merge({'$setOnInsert': {'a': 1}}, {'$unset': {'a': ''}}), {'$unset': {'a': ''}})
+
+    def test_set_on_insert_then_inc(self):
+        with self.assertRaises(ValueError):
+            self.merge({'$setOnInsert': {'a': 1}}, {'$inc': {'a': 2}})
+
+    def test_set_on_insert_then_set_on_insert(self):
+        self.assertEqual(
+            self.merge({'$setOnInsert': {'a': 1}}, {'$setOnInsert': {'a': 2, 'b': 3}}),
+            {'$setOnInsert': {'a': 1}}
+        )
+
+    def test_different_fields_are_kept(self):
+        self.assertEqual(
+            self.merge({'$set': {'a': 1}, '$setOnInsert': {'c': 0}}, {'$inc': {'b': 1}, '$unset': {'d': ''}}),
+            {'$set': {'a': 1}, '$setOnInsert': {'c': 0}, '$inc': {'b': 1}, '$unset': {'d': ''}}
+        )
+
+    def test_older_update_is_not_modified(self):
+        older = {'$inc': {'a': 1}}
+        self.merge(older, {'$inc': {'a': 2}})
+        self.assertEqual(older, {'$inc': {'a': 1}})
+
+
+class FlushTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_unreachable_database_does_not_retry_within_a_flush(self):
+        buffer = WriteBehindBuffer(max_batch=2)
+        collection = FakeCollection(error=AutoReconnect('unreachable'))
+        for i in range(3):
+            buffer.update(collection, {'id': i}, {'$inc': {'uses': 1}})
+
+        await buffer.flush()
+
+        self.assertEqual(len(collection.calls), 1)
+        self.assertEqual(buffer.metrics['pending'], 3)
+        self.assertEqual(buffer.metrics['requeued'], 2)
+        self.assertEqual(buffer.metrics['failed'], 0)
+
+    async def test_flush_writes_everything_pending(self):
+        buffer = WriteBehindBuffer(max_batch=2)
+        collection = FakeCollection()
+        for i in range(5):
+            buffer.update(collection, {'id': i % 3}, {'$inc': {'uses': 1}})
+
+        await buffer.flush()
+
+        self.assertEqual(sum(len(call) for call in collection.calls), 3)
+        self.assertEqual(buffer.metrics['written'], 3)
+        self.assertEqual(buffer.metrics['coalesced'], 2)
+        self.assertEqual(buffer.metrics['pending'], 0)
+
+
+class FakeCursor:
+
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeSettings:
+
+    def __init__(self, documents: list, upserted: dict = None):
+        self.documents = documents
+        self.upserted = upserted or {}
+        self.requests = None
+
+    def find(self, query: dict, projection: dict = None):
+        ids = query['discord_id']['$in']
+        return FakeCursor([document for document in self.documents if document['discord_id'] in ids])
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        self.requests = requests
+        return type('BulkWriteResult', (), {'upserted_ids': self.upserted})()
+
+
+class BulkSettingsTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_lagging_secondary_does_not_replace_settings_with_defaults(self):
+        client = MongoDBClient('mongodb://localhost')
+        existing = {'discord_id': 1, 'stay_signed_in': False}
+
+        # The secondary has not seen user 1 yet, so their upsert matches the primary's document instead of inserting
+        client._settings_reads = FakeSettings([])
+        client.settings = FakeSettings([existing], upserted={1: 'new-id'})
+
+        results = await client.bulk_settings([1, 2])
+
+        self.assertEqual(len(client.settings.requests), 2)
+        self.assertIs(results[1], existing)
+        self.assertEqual(results[2], client._default_settings(2))
+
+
+if __name__ == '__main__':
+    unittest.main()